@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Request, Response
+
+from core.fast_json import DecodeError, decode_callback, decode_payment, encode
+from services.menu import handle_callback
+from services.payments import handle_payment
+
+# Registered ahead of the validated routes when FAST_JSON is enabled; these
+# decode only the fields the handlers read and return pre-encoded bytes
+router = APIRouter(prefix="/api/v1", include_in_schema=False)
+
+
+def json_response(content, status_code: int = 200) -> Response:
+    return Response(encode(content), status_code=status_code, media_type="application/json")
+
+
+@router.post("/callback")
+async def service_interaction(request: Request):
+    try:
+        callback = decode_callback(await request.body())
+    except DecodeError as e:
+        return json_response({"detail": str(e)}, status_code=422)
+
+    return json_response(await handle_callback(callback))
+
+
+@router.post("/payment")
+async def service_fulfilment(request: Request):
+    try:
+        payment = decode_payment(await request.body())
+    except DecodeError as e:
+        return json_response({"detail": str(e)}, status_code=422)
+
+    content = await handle_payment(
+        session_id=payment.SessionId,
+        order_id=payment.OrderId,
+        is_successful=payment.IsSuccessful,
+        amount=payment.UnitPrice,
+        customer_number=payment.CustomerMobileNumber,
+    )
+    return json_response(content)
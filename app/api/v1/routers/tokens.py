@@ -0,0 +1,39 @@
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from core.config import settings
+from core.schema import TokenResendRequest
+from services.sms import RateLimiter
+from services.vault import NOT_FOUND, TOO_SOON, resend_token
+
+
+async def require_support_key(x_support_key: str = Header(default="")):
+    if not settings.support_api_key or not hmac.compare_digest(
+        x_support_key.encode(), settings.support_api_key.encode()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid support key")
+
+
+router = APIRouter(prefix="/api/v1/tokens", dependencies=[Depends(require_support_key)])
+
+# Caps the SMS this endpoint can cost, however many meters are tried
+_resends = RateLimiter(settings.support_resends_per_minute / 60, settings.support_resends_per_minute)
+
+
+@router.post("/resend", tags=["Support"])
+async def resend_last_token(request: TokenResendRequest):
+    """Resend the latest token for a Mobile or meter to the Mobile that bought it."""
+    if not request.mobile and not request.meter_number:
+        raise HTTPException(status_code=400, detail="Either mobile or meter_number is required")
+    if not _resends.try_acquire():
+        raise HTTPException(status_code=429, detail="Too many resends, please try again shortly")
+
+    outcome = await resend_token(
+        mobile=request.mobile, meter_number=request.meter_number, wait=True
+    )
+    if outcome == NOT_FOUND:
+        raise HTTPException(status_code=404, detail="No token on record")
+    if outcome == TOO_SOON:
+        raise HTTPException(status_code=429, detail="A token was resent recently")
+    return {"messages": "Token resent"}
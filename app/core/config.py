@@ -1,5 +1,16 @@
+from decimal import Decimal
+
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+DEFAULT_PLATFORM_ID = 1783072172428754944
+
+
+class LaisonEndpoint(BaseModel):
+    url: str
+    platform_id: int = DEFAULT_PLATFORM_ID
+
+
 class Settings(BaseSettings):
     laison_url: str
     connection: str
@@ -11,7 +22,152 @@ class Settings(BaseSettings):
     root_key: str
     customer_care: str
 
-    model_config = SettingsConfigDict(env_file=".env")
+    # Logging: records are written by a background thread. INFO lines marked
+    # sampled are kept for log_sample_rate of sessions.
+    log_level: str = "INFO"
+    log_json: bool = True
+    log_enqueue: bool = True
+    log_sample_rate: float = 1.0
+
+    # Tracing: "" disables, "file" appends JSON lines to trace_file, "otlp"
+    # posts OTLP/HTTP JSON to trace_otlp_endpoint. Sampling is per trace.
+    tracing: str = ""
+    trace_sample_rate: float = 1.0
+    trace_file: str = "traces.jsonl"
+    trace_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    trace_otlp_timeout: float = 5.0
+    trace_flush_interval: float = 1.0
+    trace_buffer_size: int = 10000
+
+    # USSD input validation
+    meter_min_length: int = 13
+    meter_max_length: int = 0  # 0 allows any length
+    meter_check_digit: str = ""  # "" skips the check, or "luhn"
+    min_top_up: Decimal = Decimal("10")
+    max_top_up: Decimal = Decimal("10000")
+
+    # Bloom filter of known meters built from a bulk export (one meter per
+    # line, or CSV with the meter first). Rebuilt when the file changes.
+    known_meters_file: str = ""
+    known_meters_error_rate: float = 0.001
+    known_meters_refresh: float = 60.0
+
+    # Decode /callback and /payment straight into compact structs
+    fast_json: bool = False
+
+    # Inbound admission control. Callbacks may use admission_max_inflight
+    # minus the payment reserve, and new sessions only a share of that, so
+    # new sessions are shed first. 0 disables.
+    admission_max_inflight: int = 200
+    admission_payment_reserve: int = 40
+    admission_new_session_share: float = 0.8
+    admission_msisdn_rate: float = 1.0  # callbacks per second per Mobile
+    admission_msisdn_burst: float = 5.0
+    admission_msisdn_tracked: int = 100000
+
+    # Outbound HTTP connection pools
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2: bool = False
+    laison_timeout: float = 5.0
+    hubtel_timeout: float = 10.0
+
+    # LAPIS gateways, e.g. LAISON_ENDPOINTS='[{"url": "...", "platform_id": 1}]'.
+    # Falls back to laison_url when empty.
+    laison_endpoints: list[LaisonEndpoint] = []
+    laison_balancing: str = "least_outstanding"  # or "ewma"
+    laison_health_interval: float = 0.0  # seconds, 0 disables active checks
+    laison_eject_for: float = 30.0
+
+    # SMS dispatch; batching is used only when hubtel_sms_batch is set
+    hubtel_sms_batch: str = ""
+    sms_queue_size: int = 10000
+    sms_senders: int = 4
+    sms_rate_per_second: float = 50.0
+    sms_burst: float = 50.0
+    sms_batch_size: int = 50
+    sms_batch_wait: float = 0.05
+    sms_max_attempts: int = 3
+    sms_retry_base: float = 1.0
+
+    # Upstream resilience
+    ussd_hop_budget: float = 5.0
+    ussd_hop_margin: float = 1.0
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 15.0
+    limiter_initial: int = 20
+    limiter_min: int = 2
+    limiter_max: int = 200
+    limiter_latency_target: float = 1.0
+
+    # Hedged customer lookups
+    laison_hedging: bool = False
+    hedge_percentile: float = 0.95
+    hedge_budget: float = 0.05
+    hedge_min_delay: float = 0.05
+    hedge_min_samples: int = 20
+
+    # USSD session store: "memory" or "redis"
+    session_backend: str = "memory"
+    session_ttl: int = 600
+    session_maxsize: int = 50000
+    session_shards: int = 16
+    redis_url: str = "redis://localhost:6379/0"
+
+    # Rendered callback responses, keyed by (SessionId, Sequence, Message), so
+    # gateway retransmits are answered without re-running the hop. 0 disables.
+    callback_memo_ttl: int = 30
+    callback_memo_maxsize: int = 50000
+
+    # Customer lookup cache
+    customer_cache_maxsize: int = 10000
+    customer_cache_ttl: int = 300
+    customer_negative_ttl: int = 30
+
+    # Fulfilment pipeline: "queue" acknowledges /payment immediately and
+    # fulfils in the background, "inline" fulfils inside the webhook
+    fulfilment_mode: str = "queue"
+    fulfilment_db: str = "fulfilment.db"
+    fulfilment_workers: int = 4
+    fulfilment_max_attempts: int = 8
+    fulfilment_retry_base: float = 2.0
+    fulfilment_retry_max: float = 300.0
+    fulfilment_poll_interval: float = 1.0
+    ledger_cache_size: int = 10000
+
+    # Last purchase per Mobile, kept in fulfilment_db and offered at Sequence 1
+    # as a one-hop repeat top-up. This many are held in memory; 0 disables it.
+    purchase_history_size: int = 50000
+
+    # Issued tokens, sealed with AES-GCM in fulfilment_db so that they can be
+    # resent without LAPIS. vault_key is 64 hex characters; empty derives a
+    # key from root_key. A Mobile or meter gets one resend per interval.
+    token_vault: bool = True
+    vault_key: str = ""
+    # Mobiles are stored in international form; a leading 0 becomes this
+    msisdn_country_code: str = "233"
+    vault_retention_days: float = 90.0
+    vault_resend_interval: int = 60
+    # POST /api/v1/tokens/resend is for the support desk. It is only mounted
+    # when support_api_key is set, requires it in the X-Support-Key header
+    # and sends at most this many SMS per minute per worker process.
+    support_api_key: str = ""
+    support_resends_per_minute: int = 30
+
+    # Preforked serving (app/serve.py): workers forked from one preloaded
+    # parent; 0 starts one per CPU. More than one needs the redis session
+    # backend, since a session's hops and its /payment can reach any worker.
+    serve_workers: int = 1
+    serve_backlog: int = 2048
+    serve_graceful_timeout: float = 30.0
+
+    # Carry callback state in a signed HubtelRequest.ClientState token
+    stateless_sessions: bool = False
+    client_state_secret: str = ""
+
+    # Frozen so that nothing can change it after a preforked parent shares it
+    model_config = SettingsConfigDict(env_file=".env", frozen=True)
 
 
 settings = Settings()
@@ -0,0 +1,141 @@
+import json
+from dataclasses import dataclass
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class DecodeError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class CallbackRequest:
+    """The HubtelRequest fields the callback flow reads."""
+
+    SessionId: str
+    Message: str
+    Mobile: str
+    Sequence: int
+    ClientState: str | None
+
+
+@dataclass(slots=True)
+class PaymentRequest:
+    """The fields of the deeply nested PayementRequest that /payment reads."""
+
+    SessionId: str
+    OrderId: str
+    IsSuccessful: bool
+    UnitPrice: float
+    CustomerMobileNumber: str
+
+
+if msgspec is not None:
+    # Unknown fields are skipped by the decoder without being materialised
+
+    class _Callback(msgspec.Struct):
+        SessionId: str
+        Message: str
+        Mobile: str
+        Sequence: int = 1
+        ClientState: str | None = None
+
+    class _Item(msgspec.Struct):
+        UnitPrice: float
+
+    class _Payment(msgspec.Struct):
+        IsSuccessful: bool
+
+    class _OrderInfo(msgspec.Struct):
+        CustomerMobileNumber: str
+        Items: list[_Item]
+        Payment: _Payment
+
+    class _PaymentEnvelope(msgspec.Struct):
+        SessionId: str
+        OrderId: str
+        OrderInfo: _OrderInfo
+
+    _callback_decoder = msgspec.json.Decoder(_Callback)
+    _payment_decoder = msgspec.json.Decoder(_PaymentEnvelope)
+    _encoder = msgspec.json.Encoder()
+
+    def decode_callback(body: bytes) -> CallbackRequest:
+        try:
+            data = _callback_decoder.decode(body)
+        except msgspec.DecodeError as e:
+            raise DecodeError(str(e))
+        return CallbackRequest(
+            data.SessionId, data.Message, data.Mobile, data.Sequence, data.ClientState
+        )
+
+    def decode_payment(body: bytes) -> PaymentRequest:
+        try:
+            data = _payment_decoder.decode(body)
+        except msgspec.DecodeError as e:
+            raise DecodeError(str(e))
+        if not data.OrderInfo.Items:
+            raise DecodeError("OrderInfo.Items must not be empty")
+        return PaymentRequest(
+            data.SessionId,
+            data.OrderId,
+            data.OrderInfo.Payment.IsSuccessful,
+            data.OrderInfo.Items[0].UnitPrice,
+            data.OrderInfo.CustomerMobileNumber,
+        )
+
+    def encode(content) -> bytes:
+        return _encoder.encode(content)
+
+else:
+
+    def _field(data: dict, name: str, kind: type, default=...):
+        value = data.get(name, default)
+        if value is ...:
+            raise DecodeError(f"Object missing required field `{name}`")
+        if value is not default and not isinstance(value, kind):
+            raise DecodeError(f"Invalid type for `{name}`")
+        return value
+
+    def _load(body: bytes) -> dict:
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            raise DecodeError(str(e))
+        if not isinstance(data, dict):
+            raise DecodeError("Expected an object")
+        return data
+
+    def decode_callback(body: bytes) -> CallbackRequest:
+        data = _load(body)
+        sequence = _field(data, "Sequence", int, 1)
+        if isinstance(sequence, bool):
+            raise DecodeError("Invalid type for `Sequence`")
+        return CallbackRequest(
+            _field(data, "SessionId", str),
+            _field(data, "Message", str),
+            _field(data, "Mobile", str),
+            sequence,
+            _field(data, "ClientState", (str, type(None)), None),
+        )
+
+    def decode_payment(body: bytes) -> PaymentRequest:
+        data = _load(body)
+        order_info = _field(data, "OrderInfo", dict)
+        items = _field(order_info, "Items", list)
+        if not items or not isinstance(items[0], dict):
+            raise DecodeError("OrderInfo.Items must not be empty")
+        unit_price = _field(items[0], "UnitPrice", (int, float))
+        return PaymentRequest(
+            _field(data, "SessionId", str),
+            _field(data, "OrderId", str),
+            _field(_field(order_info, "Payment", dict), "IsSuccessful", bool),
+            float(unit_price),
+            _field(order_info, "CustomerMobileNumber", str),
+        )
+
+    def encode(content) -> bytes:
+        return json.dumps(content, separators=(",", ":")).encode()
@@ -0,0 +1,155 @@
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from types import MappingProxyType
+from typing import Awaitable, Callable
+
+from core.config import settings
+from core.schema import HubtelRequest, HubtelResponse
+
+
+class InvalidInput(Exception):
+    """User input that fails validation; the message is shown to the user."""
+
+
+@dataclass(frozen=True)
+class Screen:
+    """Immutable response template, validated once when it is declared.
+
+    Rendering copies the precompiled body and fills in the per-request slots,
+    so templates are never mutated and need no revalidation per hop.
+    """
+
+    Type: str
+    Message: str
+    Label: str
+    DataType: str
+    FieldType: str
+    Item: dict | None = None
+    _body: MappingProxyType = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        body = HubtelResponse(
+            Type=self.Type,
+            Message=self.Message,
+            Label=self.Label,
+            DataType=self.DataType,
+            FieldType=self.FieldType,
+            Item=self.Item,
+        ).model_dump(mode="json")
+        object.__setattr__(self, "_body", MappingProxyType(body))
+
+    def render(
+        self,
+        session_id: str,
+        message: str | None = None,
+        price: float | None = None,
+        client_state: str | None = None,
+    ) -> dict:
+        body = dict(self._body)
+        body["SessionId"] = session_id
+        if message is not None:
+            body["Message"] = message
+        if price is not None:
+            body["Item"] = {**body["Item"], "Price": price}
+        if client_state is not None:
+            body["ClientState"] = client_state
+        return body
+
+
+@dataclass(frozen=True)
+class Reply:
+    screen: Screen
+    message: str | None = None
+    price: float | None = None
+    # Session state to carry to the next hop, and the step that will handle it.
+    # A reply without a next step ends the USSD interaction.
+    state: dict = field(default_factory=dict)
+    next_step: str | None = None
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    handle: Callable[[HubtelRequest, dict], Awaitable[Reply]]
+
+
+class Flow:
+    """USSD menu as named steps; each hop is handled by the step the previous
+    reply pointed to."""
+
+    def __init__(self, start: str, steps: list[Step]):
+        self.start = start
+        self.steps = MappingProxyType({step.name: step for step in steps})
+
+    def step_for(self, request: HubtelRequest, state: dict | None) -> Step | None:
+        if request.Sequence == 1:
+            return self.steps[self.start]
+        if not state or state.get("step") not in self.steps:
+            return None
+        return self.steps[state["step"]]
+
+
+def luhn_valid(number: str) -> bool:
+    total = 0
+    for index, char in enumerate(reversed(number)):
+        digit = ord(char) - 48
+        if index % 2:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+CHECK_DIGITS = {"luhn": luhn_valid}
+
+
+def parse_meter_number(
+    text: str, min_length: int, max_length: int = 0, check_digit: str = ""
+) -> str:
+    meter_number = text.strip().replace(" ", "")
+    if (
+        not (meter_number.isascii() and meter_number.isdigit())
+        or len(meter_number) < min_length
+        or (max_length and len(meter_number) > max_length)
+        or (check_digit and not CHECK_DIGITS[check_digit](meter_number))
+    ):
+        raise InvalidInput(
+            f"Invalid meter number. Please enter the {min_length}-digit number on your meter"
+        )
+    return meter_number
+
+
+def normalise_msisdn(number: str, country_code: str) -> str:
+    """Write a Mobile in international form without the plus: 0241234567,
+    +233241234567 and 00233241234567 all become 233241234567."""
+    digits = "".join(char for char in number if char.isdigit())
+    if digits.startswith("00"):
+        return digits[2:]
+    if digits.startswith("0"):
+        return country_code + digits[1:]
+    return digits
+
+
+def normalise_mobile(mobile: str | None) -> str | None:
+    """The key a Mobile is stored under, whichever way the gateway wrote it."""
+    return normalise_msisdn(mobile, settings.msisdn_country_code) if mobile else None
+
+
+def parse_amount(text: str, minimum: Decimal, maximum: Decimal) -> Decimal:
+    try:
+        amount = Decimal(text.strip())
+    except InvalidOperation:
+        raise InvalidInput("Please enter a valid amount, for example 20 or 20.50")
+
+    if not amount.is_finite() or amount.as_tuple().exponent < -2:
+        raise InvalidInput("Please enter a valid amount, for example 20 or 20.50")
+    if amount < minimum:
+        raise InvalidInput(
+            f"The amount entered is below the minimum required. Please enter an amount greater than GHC {minimum:.2f}"
+        )
+    if amount > maximum:
+        raise InvalidInput(
+            f"The amount entered is above the maximum allowed. Please enter an amount up to GHC {maximum:.2f}"
+        )
+    return amount
@@ -0,0 +1,112 @@
+import json
+import random
+import sys
+import zlib
+
+from loguru import logger
+
+from core.config import settings
+
+REDACTED = "***"
+
+# Extra fields that never reach the sink in clear
+SECRET_FIELDS = frozenset(
+    {
+        "authorization",
+        "client_secret",
+        "clientsecret",
+        "hubtel_api_key",
+        "password",
+        "root_key",
+        "secret",
+        "token",
+    }
+)
+
+_secrets: tuple[str, ...] = ()
+
+
+def _keep(record) -> bool:
+    """Sample INFO records logged with ``sampled=True``.
+
+    Sampling is keyed on session_id when present, so a kept session keeps
+    every one of its lines instead of a random subset.
+    """
+    if settings.log_sample_rate >= 1 or record["level"].no != 20:
+        return True
+    extra = record["extra"]
+    if not extra.get("sampled"):
+        return True
+    key = extra.get("session_id") or extra.get("order_id")
+    if key is None:
+        return random.random() < settings.log_sample_rate
+    return zlib.crc32(str(key).encode()) % 10000 < settings.log_sample_rate * 10000
+
+
+def redact(text: str) -> str:
+    for secret in _secrets:
+        text = text.replace(secret, REDACTED)
+    return text
+
+
+def _fields(extra: dict) -> dict:
+    return {
+        key: REDACTED if key.lower() in SECRET_FIELDS else value
+        for key, value in extra.items()
+        if key != "sampled"
+    }
+
+
+def _write(message):
+    # Runs on loguru's writer thread when log_enqueue is set
+    record = message.record
+    fields = _fields(record["extra"])
+    # loguru appends the traceback to the (empty) handler format before queueing
+    error = str(message).strip() or None
+
+    if settings.log_json:
+        line = json.dumps(
+            {
+                "time": record["time"].isoformat(),
+                "level": record["level"].name,
+                "logger": f"{record['name']}:{record['function']}:{record['line']}",
+                "message": record["message"],
+                **fields,
+                **({"exception": error} if error else {}),
+            },
+            default=str,
+        )
+    else:
+        extras = " ".join(f"{key}={value}" for key, value in fields.items())
+        line = (
+            f"{record['time']:YYYY-MM-DD HH:mm:ss.SSS} | {record['level'].name:<8} | "
+            f"{record['name']}:{record['function']}:{record['line']} - {record['message']}"
+            f"{' | ' + extras if extras else ''}{chr(10) + error if error else ''}"
+        )
+
+    sys.stderr.write(redact(line) + "\n")
+
+
+def setup_logging():
+    """Replace loguru's synchronous stderr handler with the enqueued sink."""
+    global _secrets
+    _secrets = tuple(
+        secret
+        for secret in (
+            settings.client_secret,
+            settings.hubtel_api_key,
+            settings.root_key,
+            settings.client_state_secret,
+        )
+        if len(secret) >= 4
+    )
+
+    logger.remove()
+    logger.add(
+        _write,
+        level=settings.log_level.upper(),
+        format="",
+        filter=_keep,
+        enqueue=settings.log_enqueue,
+        catch=True,
+    )
@@ -1,27 +1,47 @@
-MESSAGES = {
-    1: {
-        "Type": "response",
-        "Message": "Welcome to NUMA!\n\n Enter your meter number",
-        "Label": "Welcome page",
-        "DataType": "input",
-        "FieldType": "number",
-    },
-    2: {
-        "Type": "response",
-        "Message": "",
-        "Label": "amount",
-        "DataType": "input",
-        "FieldType": "decimal",
-    },
-    3: {
-        "Type": "AddToCart",
-        "Message": "The request has been submitted. Please wait for a payment prompt soon",
-        "Item": {"ItemName": "Send Money", "Qty": 1, "Price": 0.0},
-        "Label": "The request has been submitted. Please wait for a payment prompt soon",
-        "DataType": "display",
-        "FieldType": "text",
-    },
-}
+from types import MappingProxyType
+
+from core.flow import Screen
+
+SCREENS = MappingProxyType(
+    {
+        "welcome": Screen(
+            Type="response",
+            Message="Welcome to NUMA!\n\n Enter your meter number",
+            Label="Welcome page",
+            DataType="input",
+            FieldType="number",
+        ),
+        "repeat": Screen(
+            Type="response",
+            Message="",
+            Label="Repeat top up",
+            DataType="input",
+            FieldType="number",
+        ),
+        "amount": Screen(
+            Type="response",
+            Message="",
+            Label="amount",
+            DataType="input",
+            FieldType="decimal",
+        ),
+        "cart": Screen(
+            Type="AddToCart",
+            Message="The request has been submitted. Please wait for a payment prompt soon",
+            Item={"ItemName": "Send Money", "Qty": 1, "Price": 0.0},
+            Label="The request has been submitted. Please wait for a payment prompt soon",
+            DataType="display",
+            FieldType="text",
+        ),
+        "release": Screen(
+            Type="release",
+            Message="",
+            Label="Release",
+            DataType="display",
+            FieldType="text",
+        ),
+    }
+)
 
 
 TOKEN_ERROR_MESSAGES = {
@@ -0,0 +1,234 @@
+"""In-process metrics rendered in the Prometheus text format.
+
+Everything records from the event loop thread, so recording is a dict lookup
+and an increment with no locking. Values that already live elsewhere (cache
+counters, limiter in-flight counts) are read by collectors at scrape time
+rather than mirrored on the hot path.
+"""
+
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+# Seconds; spans a cached lookup through to a hop that blows the USSD budget
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    @abstractmethod
+    def samples(self) -> Iterable[str]: ...
+
+    def render(self) -> list[str]:
+        return [*self.header(), *self.samples()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        # Per label set: one count per bucket plus +Inf, then the sum
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labels):
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _labels(self.labels, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {counts[-1]}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Collected(Metric):
+    """Metric whose samples are read from ``collect`` at scrape time."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...],
+        collect: Callable[[], dict[tuple, float]],
+        kind: str = "gauge",
+    ):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+        self.kind = kind
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.collect().items():
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def collected(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...],
+        collect: Callable[[], dict[tuple, float]],
+        kind: str = "gauge",
+    ) -> Collected:
+        return self.register(Collected(name, documentation, labels, collect, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_inflight = registry.gauge(
+    "http_requests_inflight", "HTTP requests currently being served"
+)
+http_request_seconds = registry.histogram(
+    "http_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+ussd_hop_seconds = registry.histogram(
+    "ussd_hop_seconds", "USSD callback latency by Sequence", ("sequence",)
+)
+upstream_request_seconds = registry.histogram(
+    "upstream_request_seconds",
+    "Upstream call latency by operation",
+    ("upstream", "operation"),
+)
+upstream_responses_total = registry.counter(
+    "upstream_responses_total",
+    "Upstream call outcomes: HTTP status, timeout, transport_error or busy",
+    ("upstream", "operation", "code"),
+)
+lapis_error_codes_total = registry.counter(
+    "lapis_error_codes_total", "LAPIS errorcode values by operation", ("operation", "errorcode")
+)
+admission_shed_total = registry.counter(
+    "admission_shed_total", "Requests shed before reaching a handler", ("route", "reason")
+)
+
+
+def sequence_label(sequence: int) -> str:
+    # Sequence is client supplied; bound the label's cardinality
+    return str(sequence) if 0 < sequence < 10 else "10+"
+
+
+class MetricsMiddleware:
+    """Records in-flight count and latency per matched route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_inflight.inc()
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_inflight.dec()
+            # Unmatched paths share one label so scanners cannot grow the registry
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.monotonic() - start,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status,
+            )
@@ -34,6 +34,7 @@ class HubtelResponse(BaseModel):
     Label: str
     DataType: DataTypes
     FieldType: FieldTypes
+    ClientState: str | None = None
 
 
 class HubtelRequest(BaseModel):
@@ -95,3 +96,8 @@ class HubtelCallBackRequest(BaseModel):
     OrderId: str
     ServiceStatus: Status
     MetaData: None = None
+
+
+class TokenResendRequest(BaseModel):
+    meter_number: str | None = None
+    mobile: str | None = None
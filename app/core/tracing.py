@@ -0,0 +1,312 @@
+"""Lightweight spans across the callback-to-fulfilment flow.
+
+A trace id is derived from the SessionId, so every USSD hop, the /payment
+webhook and the background fulfilment of the same top-up land in one trace,
+even when they run in different processes. Sampling is decided from the
+trace id for the same reason.
+
+When tracing is disabled span() hands back a shared no-op, so instrumented
+code pays a global lookup and a call.
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextvars import ContextVar
+from hashlib import blake2b
+
+from loguru import logger
+
+from core.config import settings
+
+_current: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+
+def trace_id_for(key: str) -> str:
+    return blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def _sampled(trace_id: str) -> bool:
+    return int(trace_id[:8], 16) < settings.trace_sample_rate * 0x100000000
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key: str, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "error",
+        "_token",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.end_ns = 0
+        self.error = None
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        if _exporter is not None:
+            _exporter.export(self)
+        return False
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+def span(name: str, trace_key: str | None = None, **attributes):
+    """Open a span under the current one, or start/join the trace for ``trace_key``.
+
+    Without a ``trace_key`` and outside any span nothing is recorded.
+    """
+    if _exporter is None:
+        return _NOOP
+
+    parent = _current.get()
+    if trace_key is not None:
+        trace_id = trace_id_for(trace_key)
+        if parent is not None and parent.trace_id != trace_id:
+            parent = None
+    elif parent is not None:
+        trace_id = parent.trace_id
+    else:
+        return _NOOP
+
+    if not _sampled(trace_id):
+        return _NOOP
+    return Span(name, trace_id, parent.span_id if parent else None, attributes)
+
+
+def traced(name: str, trace_key: str | None = None, attributes: tuple[str, ...] = ()):
+    """Run an async function inside span(); keys name its arguments.
+
+    ``trace_key`` and ``attributes`` may be "arg" or "arg.field" to read a
+    key or attribute of an argument.
+    """
+
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        def lookup(arguments: dict, path: str):
+            arg, _, field = path.partition(".")
+            value = arguments.get(arg)
+            if not field or value is None:
+                return value
+            return value.get(field) if isinstance(value, dict) else getattr(value, field, None)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _exporter is None:
+                return await func(*args, **kwargs)
+            arguments = signature.bind(*args, **kwargs).arguments
+            with span(
+                name,
+                trace_key=lookup(arguments, trace_key) if trace_key else None,
+                **{path.rpartition(".")[2]: lookup(arguments, path) for path in attributes},
+            ):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class SpanExporter(ABC):
+    """Buffers finished spans and flushes them from a background task."""
+
+    def __init__(self, buffer_size: int):
+        self._buffer: deque[Span] = deque()
+        self.buffer_size = buffer_size
+        self.exported = 0
+        self.dropped = 0
+        self._task: asyncio.Task | None = None
+
+    def export(self, finished: Span):
+        if len(self._buffer) >= self.buffer_size:
+            self.dropped += 1
+            return
+        self._buffer.append(finished)
+
+    def start(self, interval: float):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        batch = [self._buffer.popleft() for _ in range(len(self._buffer))]
+        try:
+            await self._write(batch)
+            self.exported += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.warning("Failed to export spans", spans=len(batch), error=str(e))
+
+    @abstractmethod
+    async def _write(self, batch: list[Span]): ...
+
+    def stats(self) -> dict:
+        return {
+            "exporter": settings.tracing,
+            "buffered": len(self._buffer),
+            "exported": self.exported,
+            "dropped": self.dropped,
+        }
+
+
+class FileExporter(SpanExporter):
+    def __init__(self, path: str, buffer_size: int):
+        super().__init__(buffer_size)
+        self.path = path
+
+    async def _write(self, batch: list[Span]):
+        lines = "".join(json.dumps(item.to_dict(), default=str) + "\n" for item in batch)
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: str):
+        with open(self.path, "a") as f:
+            f.write(lines)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpExporter(SpanExporter):
+    """Posts OTLP/HTTP JSON to a collector."""
+
+    def __init__(self, endpoint: str, buffer_size: int):
+        super().__init__(buffer_size)
+        self.endpoint = endpoint
+
+    @staticmethod
+    def encode(batch: list[Span]) -> dict:
+        spans = []
+        for item in batch:
+            encoded = {
+                "traceId": item.trace_id,
+                "spanId": item.span_id,
+                "name": item.name,
+                "kind": 1,
+                "startTimeUnixNano": str(item.start_ns),
+                "endTimeUnixNano": str(item.end_ns),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)}
+                    for key, value in item.attributes.items()
+                ],
+                "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+            }
+            if item.parent_id:
+                encoded["parentSpanId"] = item.parent_id
+            spans.append(encoded)
+
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [{"key": "service.name", "value": {"stringValue": "numa"}}]
+                    },
+                    "scopeSpans": [{"scope": {"name": "numa"}, "spans": spans}],
+                }
+            ]
+        }
+
+    async def _write(self, batch: list[Span]):
+        from services.clients import get_client
+
+        res = await get_client("otlp").post(self.endpoint, json=self.encode(batch))
+        res.raise_for_status()
+
+
+def create_exporter() -> SpanExporter | None:
+    if settings.tracing == "file":
+        return FileExporter(settings.trace_file, settings.trace_buffer_size)
+    if settings.tracing == "otlp":
+        return OtlpExporter(settings.trace_otlp_endpoint, settings.trace_buffer_size)
+    return None
+
+
+_exporter = create_exporter()
+
+
+def start_tracing():
+    if _exporter is not None:
+        _exporter.start(settings.trace_flush_interval)
+
+
+async def stop_tracing():
+    if _exporter is not None:
+        await _exporter.stop()
+
+
+def tracing_stats() -> dict:
+    return _exporter.stats() if _exporter is not None else {"exporter": None}
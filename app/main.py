@@ -1,9 +1,78 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, responses
 from fastapi.middleware.cors import CORSMiddleware
+from loguru import logger
+
+from api.v1.routers import fast, tokens, ussd
+from core.config import settings
+from core.logging import setup_logging
+from core.tracing import start_tracing, stop_tracing, tracing_stats
+from core.metrics import MetricsMiddleware, registry
+from services.admission import AdmissionMiddleware, admission
+from services.clients import close_clients, pool_stats, start_clients
+from services.database import open_databases
+from services.fulfilment import fulfilment_worker
+from services.history import purchase_history
+from services.laison import customer_cache, lookup_hedger
+from services.menu import callback_memo
+from services.meter_filter import known_meters
+from services.resilience import upstream_stats, upstreams
+from services.routing import laison_pool
+from services.sms import sms_dispatcher
+from services.vault import vault_stats
+from services.session import sessions
+
+
+async def warm_up(app: FastAPI):
+    """Runs once the worker is accepting; /ready answers 503 until it is done."""
+    start = time.monotonic()
+    try:
+        await asyncio.gather(
+            known_meters.start(settings.known_meters_refresh),
+            asyncio.to_thread(open_databases),
+            # Also leaves a pooled connection open to every LAPIS endpoint
+            laison_pool.check_all(),
+        )
+    except Exception as e:
+        # Still serve; the first requests only pay what warm-up would have
+        logger.error("Warm-up failed", error=str(e))
+    app.state.ready = True
+    logger.info("Ready", seconds=round(time.monotonic() - start, 3))
+
 
-from api.v1.routers import ussd
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_clients(["hubtel", *laison_pool.client_names])
+    laison_pool.start_health_checks(settings.laison_health_interval)
+    start_tracing()
+    sms_dispatcher.start()
+    if settings.fulfilment_mode == "queue" and settings.fulfilment_workers > 0:
+        fulfilment_worker.start(settings.fulfilment_workers)
+    # uvicorn only accepts once this yields, so warming up before it would
+    # leave /ready nothing to gate
+    warming = asyncio.create_task(warm_up(app))
+    yield
+    app.state.ready = False
+    warming.cancel()
+    await asyncio.gather(warming, return_exceptions=True)
+    await fulfilment_worker.stop()
+    await known_meters.stop()
+    await sms_dispatcher.stop()
+    await laison_pool.stop_health_checks()
+    # Flush spans recorded during shutdown before the pools close
+    await stop_tracing()
+    await close_clients()
+    await sessions.close()
+    await logger.complete()
 
-app = FastAPI(title="NUMA")
+
+setup_logging()
+
+app = FastAPI(title="NUMA", lifespan=lifespan)
+app.state.ready = False
 
 origins = ["*"]
 
@@ -14,10 +83,128 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Outermost, so shed requests never reach routing or the latency histograms
+app.add_middleware(AdmissionMiddleware)
 
+registry.collected(
+    "session_cache_requests_total",
+    "Session store lookups by result",
+    ("result",),
+    lambda: {("hit",): sessions.hits, ("miss",): sessions.misses},
+    kind="counter",
+)
+registry.collected(
+    "customer_cache_requests_total",
+    "Customer lookup cache requests by result",
+    ("result",),
+    lambda: {
+        (result,): customer_cache.stats()[key]
+        for result, key in (
+            ("hit", "hits"),
+            ("negative_hit", "negative_hits"),
+            ("miss", "misses"),
+            ("coalesced", "coalesced"),
+        )
+    },
+    kind="counter",
+)
+registry.collected(
+    "callback_memo_requests_total",
+    "Callback memo lookups: hit and coalesced are answered retransmits",
+    ("result",),
+    lambda: {
+        ("hit",): callback_memo.hits,
+        ("coalesced",): callback_memo.coalesced,
+        ("miss",): callback_memo.misses,
+    },
+    kind="counter",
+)
+registry.collected(
+    "upstream_inflight",
+    "Calls in flight per upstream",
+    ("upstream",),
+    lambda: {(name,): upstream.inflight for name, upstream in upstreams.items()},
+)
+
+if settings.fast_json:
+    # Matched first, so it shadows the validated /callback and /payment routes
+    app.include_router(router=fast.router)
 app.include_router(router=ussd.router)
+if settings.token_vault and settings.support_api_key:
+    app.include_router(router=tokens.router)
 
 
 @app.get("/")
 async def index():
     return responses.RedirectResponse("/docs")
+
+
+@app.get("/ready", tags=["Health"])
+async def ready():
+    # Load balancers hold traffic until warm-up has finished, and drain the
+    # replica once shutdown starts
+    if not app.state.ready:
+        return responses.JSONResponse({"ready": False}, status_code=503)
+    return {"ready": True}
+
+
+@app.get("/pool-stats", tags=["Health"])
+async def get_pool_stats():
+    return pool_stats()
+
+
+@app.get("/session-stats", tags=["Health"])
+async def get_session_stats():
+    return sessions.stats()
+
+
+@app.get("/cache-stats", tags=["Health"])
+async def get_cache_stats():
+    return {
+        "customer": customer_cache.stats(),
+        "callback_memo": callback_memo.stats(),
+        "known_meters": known_meters.stats(),
+        "purchase_history": purchase_history.stats(),
+    }
+
+
+@app.get("/fulfilment-stats", tags=["Health"])
+async def get_fulfilment_stats():
+    return await fulfilment_worker.queue.counts()
+
+
+@app.get("/upstream-stats", tags=["Health"])
+async def get_upstream_stats():
+    return {
+        **upstream_stats(),
+        "laison_endpoints": laison_pool.stats(),
+        "lookup_hedging": lookup_hedger.stats(),
+    }
+
+
+@app.get("/sms-stats", tags=["Health"])
+async def get_sms_stats():
+    return sms_dispatcher.stats()
+
+
+@app.get("/vault-stats", tags=["Health"])
+async def get_vault_stats():
+    return vault_stats()
+
+
+@app.get("/admission-stats", tags=["Health"])
+async def get_admission_stats():
+    return admission.stats()
+
+
+@app.get("/tracing-stats", tags=["Health"])
+async def get_tracing_stats():
+    return tracing_stats()
+
+
+@app.get("/metrics", tags=["Health"])
+async def get_metrics():
+    return responses.PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4"
+    )
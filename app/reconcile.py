@@ -0,0 +1,365 @@
+"""Reconcile Hubtel orders against LAPIS purchases.
+
+Both exports (CSV or JSON lines, optionally gzipped) are streamed into hash
+partitions on disk keyed by the transaction id, OrderId[:16], and joined one
+partition at a time, so memory is bounded by a partition rather than by the
+exports:
+
+    python app/reconcile.py --orders orders.csv --purchases lapis.jsonl --out mismatches.jsonl
+
+Each mismatch is written as a JSON line with one of these classes:
+
+    missing_token       paid order with no LAPIS purchase
+    purchase_failed     paid order whose purchases all carry a non-zero errorcode
+    duplicate_purchase  more than one successful purchase for a paid order
+    amount_mismatch     paid order and purchase amounts differ
+    meter_mismatch      paid order and purchase meter numbers differ
+    unpaid_token        successful purchase for an order Hubtel does not show as paid
+    orphan_purchase     purchase with no Hubtel order
+
+With --redrive, orders in the re-drivable classes are fulfilled again through
+the normal purchase path, --concurrency at a time:
+
+    python app/reconcile.py --orders orders.csv --purchases lapis.jsonl --redrive
+"""
+
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import sys
+import tempfile
+import zlib
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from loguru import logger
+
+from core.logging import setup_logging
+from services.clients import close_clients, start_clients
+from services.fulfilment import build_order, fulfil_order, fulfilment_worker
+from services.ledger import ledger
+from services.routing import laison_pool
+from services.sms import sms_dispatcher
+
+MISSING_TOKEN = "missing_token"
+PURCHASE_FAILED = "purchase_failed"
+DUPLICATE_PURCHASE = "duplicate_purchase"
+AMOUNT_MISMATCH = "amount_mismatch"
+METER_MISMATCH = "meter_mismatch"
+UNPAID_TOKEN = "unpaid_token"
+ORPHAN_PURCHASE = "orphan_purchase"
+
+REDRIVABLE = (MISSING_TOKEN, PURCHASE_FAILED)
+PAID_STATUSES = {"paid", "success", "successful", "true", "1"}
+AMOUNT_TOLERANCE = Decimal("0.01")
+
+
+def read_rows(path: str):
+    """Yield rows of a CSV or JSON-lines export, gzipped or not."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="") as f:
+        if path.removesuffix(".gz").endswith(".csv"):
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def lookup(row: dict, path: str):
+    """Read a column, or a dotted path into nested JSON such as OrderInfo.Items.0.UnitPrice."""
+    if path in row:
+        return row[path]
+    value = row
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return None
+    return value
+
+
+def text(value) -> str | None:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def amounts_differ(first: str | None, second: str | None) -> bool:
+    try:
+        return abs(Decimal(first) - Decimal(second)) > AMOUNT_TOLERANCE
+    except (TypeError, InvalidOperation):
+        # A missing or unreadable amount is not evidence of a mismatch
+        return False
+
+
+def normalise_order(row: dict, args) -> dict | None:
+    order_id = text(lookup(row, args.order_id))
+    if order_id is None:
+        return None
+    status = text(lookup(row, args.order_status)) or ""
+    return {
+        "transaction_id": order_id[:16],
+        "order_id": order_id,
+        "paid": status.lower() in PAID_STATUSES,
+        "amount": text(lookup(row, args.order_amount)),
+        "meter_number": text(lookup(row, args.order_meter)),
+        "customer_number": text(lookup(row, args.order_mobile)),
+        "session_id": text(lookup(row, args.order_session)),
+    }
+
+
+def normalise_purchase(row: dict, args) -> dict | None:
+    transaction_id = text(lookup(row, args.purchase_id))
+    if transaction_id is None:
+        return None
+    return {
+        "transaction_id": transaction_id,
+        # Exports of successful purchases only may have no errorcode column
+        "errorcode": text(lookup(row, args.purchase_errorcode)) or "0",
+        "amount": text(lookup(row, args.purchase_amount)),
+        "meter_number": text(lookup(row, args.purchase_meter)),
+    }
+
+
+class Partitions:
+    """JSON-lines spill files, one per hash partition of the transaction id."""
+
+    def __init__(self, directory: str, name: str, count: int):
+        self.paths = [Path(directory) / f"{name}-{index}.jsonl" for index in range(count)]
+        self._files = [open(path, "w") for path in self.paths]
+        self.rows = 0
+
+    def add(self, record: dict):
+        index = zlib.crc32(record["transaction_id"].encode()) % len(self._files)
+        self._files[index].write(json.dumps(record) + "\n")
+        self.rows += 1
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+    def read(self, index: int):
+        with open(self.paths[index]) as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def partition(path: str, normalise, directory: str, name: str, count: int, args) -> Partitions:
+    partitions = Partitions(directory, name, count)
+    skipped = 0
+    try:
+        for row in read_rows(path):
+            record = normalise(row, args)
+            if record is None:
+                skipped += 1
+                continue
+            partitions.add(record)
+    finally:
+        partitions.close()
+    logger.info("Partitioned export", export=name, rows=partitions.rows, skipped=skipped)
+    return partitions
+
+
+def classify(order: dict, purchases: list[dict]) -> str | None:
+    successful = [purchase for purchase in purchases if purchase["errorcode"] == "0"]
+    if not order["paid"]:
+        return UNPAID_TOKEN if successful else None
+    if not purchases:
+        return MISSING_TOKEN
+    if not successful:
+        return PURCHASE_FAILED
+    if len(successful) > 1:
+        return DUPLICATE_PURCHASE
+    purchase = successful[0]
+    if amounts_differ(order["amount"], purchase["amount"]):
+        return AMOUNT_MISMATCH
+    if order["meter_number"] and purchase["meter_number"] and (
+        order["meter_number"] != purchase["meter_number"]
+    ):
+        return METER_MISMATCH
+    return None
+
+
+def join(orders: Partitions, purchases: Partitions, report, redrive_file, redrive_classes):
+    """Hash join one partition at a time; only its purchases are held in memory."""
+    counts = {"orders": 0, "purchases": purchases.rows, "matched": 0}
+    for index in range(len(orders.paths)):
+        by_transaction: dict[str, list[dict]] = {}
+        for purchase in purchases.read(index):
+            by_transaction.setdefault(purchase["transaction_id"], []).append(purchase)
+
+        seen_orders = set()
+        joined = set()
+        for order in orders.read(index):
+            # Exports repeat rows when an order is updated; keep the first
+            if order["order_id"] in seen_orders:
+                continue
+            seen_orders.add(order["order_id"])
+            counts["orders"] += 1
+
+            found = by_transaction.get(order["transaction_id"], [])
+            joined.add(order["transaction_id"])
+            kind = classify(order, found)
+            if kind is None:
+                counts["matched"] += order["paid"]
+                continue
+            counts[kind] = counts.get(kind, 0) + 1
+            report.write(json.dumps({"class": kind, "order": order, "purchases": found}) + "\n")
+            if kind in redrive_classes:
+                redrive_file.write(json.dumps(order) + "\n")
+
+        for transaction_id, found in by_transaction.items():
+            if transaction_id not in joined:
+                counts[ORPHAN_PURCHASE] = counts.get(ORPHAN_PURCHASE, 0) + 1
+                report.write(
+                    json.dumps({"class": ORPHAN_PURCHASE, "order": None, "purchases": found}) + "\n"
+                )
+    return counts
+
+
+async def redrive_order(row: dict) -> str:
+    order_id = row["order_id"]
+    async with ledger.lock(order_id):
+        if await fulfilment_worker.queue.status(order_id) in ("pending", "running"):
+            # The fulfilment workers still own it
+            return "skipped_queued"
+
+        order = await ledger.get(order_id)
+        if order is None:
+            if not row["meter_number"] or not row["amount"] or not row["customer_number"]:
+                return "skipped_incomplete"
+            order = build_order(
+                session_id=row["session_id"] or "",
+                order_id=order_id,
+                meter_number=row["meter_number"],
+                amount=float(row["amount"]),
+                customer_number=row["customer_number"],
+            )
+        elif order["token_status"] == "success":
+            # LAPIS issued a token the export does not show yet
+            return "skipped_ledger_success"
+        else:
+            # Retry the purchase and resend the SMS; Hubtel is only confirmed
+            # again if it never was
+            order = {**order, "token_status": None, "token_message": None, "sms_sent": False}
+
+        await fulfil_order(order)
+    await fulfilment_worker.queue.complete(order_id)
+    return "fulfilled"
+
+
+async def redrive(path: str, concurrency: int, batch_size: int) -> dict:
+    await start_clients(["hubtel", *laison_pool.client_names])
+    sms_dispatcher.start()
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes: dict[str, int] = {}
+
+    async def run(row: dict):
+        async with semaphore:
+            try:
+                outcome = await redrive_order(row)
+            except Exception as e:
+                outcome = "failed"
+                logger.error(
+                    "Re-drive failed",
+                    order_id=row["order_id"],
+                    error=getattr(e, "detail", None) or str(e),
+                )
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    try:
+        batch = []
+        with open(path) as f:
+            for line in f:
+                batch.append(json.loads(line))
+                if len(batch) == batch_size:
+                    await asyncio.gather(*(run(row) for row in batch))
+                    logger.info("Re-drive batch finished", **outcomes)
+                    batch = []
+        if batch:
+            await asyncio.gather(*(run(row) for row in batch))
+    finally:
+        await sms_dispatcher.stop()
+        await close_clients()
+    return outcomes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile Hubtel orders against LAPIS purchases")
+    parser.add_argument("--orders", required=True, help="Hubtel order export (.csv/.jsonl[.gz])")
+    parser.add_argument("--purchases", required=True, help="LAPIS transaction export")
+    parser.add_argument("--out", help="mismatch report, JSON lines (default stdout)")
+    parser.add_argument("--partitions", type=int, default=64)
+    parser.add_argument("--spill-dir", help="where partitions are written (default system temp)")
+
+    columns = parser.add_argument_group(
+        "columns", "column names, or dotted paths into nested JSON rows"
+    )
+    columns.add_argument("--order-id", default="OrderId")
+    columns.add_argument("--order-status", default="Status")
+    columns.add_argument("--order-amount", default="Amount")
+    columns.add_argument("--order-meter", default="MeterNumber")
+    columns.add_argument("--order-mobile", default="CustomerMobileNumber")
+    columns.add_argument("--order-session", default="SessionId")
+    columns.add_argument("--purchase-id", default="transid")
+    columns.add_argument("--purchase-errorcode", default="errorcode")
+    columns.add_argument("--purchase-amount", default="rechargeamount")
+    columns.add_argument("--purchase-meter", default="meternumber")
+
+    redrive_group = parser.add_argument_group("re-drive")
+    redrive_group.add_argument("--redrive", action="store_true", help="fulfil re-drivable orders")
+    redrive_group.add_argument(
+        "--redrive-classes",
+        default=",".join(REDRIVABLE),
+        help="comma-separated classes to re-drive",
+    )
+    redrive_group.add_argument("--concurrency", type=int, default=8)
+    redrive_group.add_argument("--batch-size", type=int, default=500)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    redrive_classes = set(args.redrive_classes.split(",")) - {""}
+    unknown = redrive_classes - set(REDRIVABLE)
+    if unknown:
+        raise SystemExit(f"Only {', '.join(REDRIVABLE)} can be re-driven, not {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory(dir=args.spill_dir) as directory:
+        orders = partition(args.orders, normalise_order, directory, "orders", args.partitions, args)
+        purchases = partition(
+            args.purchases, normalise_purchase, directory, "purchases", args.partitions, args
+        )
+
+        redrive_path = Path(directory) / "redrive.jsonl"
+        report = open(args.out, "w") if args.out else sys.stdout
+        try:
+            with open(redrive_path, "w") as redrive_file:
+                summary = join(orders, purchases, report, redrive_file, redrive_classes)
+        finally:
+            if report is not sys.stdout:
+                report.close()
+        logger.info("Reconciliation finished", **summary)
+
+        if args.redrive:
+            summary["redrive"] = asyncio.run(
+                redrive(str(redrive_path), args.concurrency, args.batch_size)
+            )
+            logger.info("Re-drive finished", **summary["redrive"])
+
+    print(json.dumps(summary), file=sys.stderr)
+    return summary
+
+
+if __name__ == "__main__":
+    setup_logging()
+    try:
+        main()
+    finally:
+        logger.complete()
@@ -0,0 +1,169 @@
+"""Preforked server.
+
+The parent imports the app once, loads the known-meter filter and moves
+everything built so far out of the garbage collector's reach, so that those
+pages stay shared copy-on-write instead of being dirtied by collections in
+every worker. It then binds the port and forks the workers, which accept on
+the inherited socket and run the usual lifespan:
+
+    python app/serve.py --host 0.0.0.0 --port 8000 --workers 4
+
+A worker that dies is replaced. SIGTERM or SIGINT drains the workers and
+exits. With a single worker there is nothing to share or supervise, so the
+app is served from the parent itself, as plain uvicorn would.
+
+Consecutive hops of a USSD session, and its /payment webhook, can each land
+on a different worker, so more than one worker needs SESSION_BACKEND=redis.
+Caches, the callback memo, admission limits and metrics stay per worker: a
+retransmitted hop that reaches another worker runs its step again.
+"""
+
+import argparse
+import asyncio
+import gc
+import importlib
+import os
+import random
+import signal
+import socket
+import time
+
+import uvicorn
+from loguru import logger
+
+import main
+from core.config import settings
+from services.clients import ssl_context
+from services.meter_filter import known_meters
+
+# A worker that exits sooner than this after starting is crash-looping
+MIN_WORKER_LIFETIME = 1.0
+
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload():
+    # Everything here is built once rather than once per worker
+    ssl_context()
+    # httpx only imports its transport when the first client is built
+    importlib.import_module("httpcore")
+    # A worker's own refresh then finds the export unchanged
+    if settings.known_meters_file:
+        asyncio.run(known_meters.refresh())
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(sock: socket.socket):
+    # Out of the parent's process group, so that a terminal's Ctrl-C reaches
+    # the parent only and each worker is told to stop exactly once
+    os.setpgid(0, 0)
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    # Forked workers would otherwise draw the same span ids and log samples
+    random.seed()
+    serve(sock)
+
+
+def serve(sock: socket.socket):
+    config = uvicorn.Config(main.app, lifespan="on", log_config=None, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, sock: socket.socket, workers: int, graceful_timeout: float):
+        self.sock = sock
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.children: dict[int, float] = {}
+        self.deadline: float | None = None
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.sock)
+            except BaseException:
+                logger.exception("Worker failed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+
+    def stop(self, signum, frame):
+        if self.deadline is not None:
+            return
+        logger.info("Stopping workers", signal=signal.Signals(signum).name)
+        self.deadline = time.monotonic() + self.graceful_timeout
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        logger.info("Serving", workers=self.workers, pid=os.getpid())
+
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if self.deadline is not None and time.monotonic() > self.deadline:
+                    logger.warning("Killing workers that did not drain", workers=len(self.children))
+                    for child in self.children:
+                        os.kill(child, signal.SIGKILL)
+                    self.deadline = float("inf")
+                time.sleep(0.1)
+                continue
+
+            started = self.children.pop(pid)
+            if self.deadline is not None:
+                continue
+            logger.warning(
+                "Worker exited, starting another",
+                pid=pid,
+                exit_code=os.waitstatus_to_exitcode(status),
+            )
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            self.spawn()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Preforked NUMA server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=settings.serve_workers, help="0 starts one per CPU"
+    )
+    args = parser.parse_args(argv)
+    args.workers = args.workers or os.cpu_count() or 1
+    if args.workers > 1 and settings.session_backend != "redis":
+        parser.error(
+            f"{args.workers} workers need SESSION_BACKEND=redis; with the "
+            f"{settings.session_backend!r} backend each worker has its own sessions"
+        )
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    preload()
+    sock = bind(args.host, args.port, settings.serve_backlog)
+    if args.workers == 1:
+        serve(sock)
+    else:
+        Supervisor(sock, args.workers, settings.serve_graceful_timeout).run()
+    logger.complete()
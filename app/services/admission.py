@@ -0,0 +1,182 @@
+import json
+
+from cachetools import TTLCache
+from loguru import logger
+from starlette.responses import JSONResponse
+
+from core.config import settings
+from core.metrics import admission_shed_total
+from services.menu import SERVICE_BUSY, release
+from services.sms import RateLimiter
+
+CALLBACK_PATH = "/api/v1/callback"
+PAYMENT_PATH = "/api/v1/payment"
+
+TOO_MANY_REQUESTS = "You are sending requests too quickly. Please wait a moment and try again"
+
+
+class AdmissionController:
+    """Bounds in-flight work per route and callback rate per Mobile.
+
+    Payments may use all of ``max_inflight``; callbacks stop short of the
+    payment reserve, and new sessions (Sequence 1) stop at a share of the
+    callback capacity so sessions already under way finish first.
+    """
+
+    def __init__(
+        self,
+        max_inflight: int,
+        payment_reserve: int,
+        new_session_share: float,
+        msisdn_rate: float,
+        msisdn_burst: float,
+        msisdn_tracked: int,
+    ):
+        self.max_inflight = max_inflight
+        self.callback_limit = max(1, max_inflight - payment_reserve)
+        self.new_session_limit = max(1, int(self.callback_limit * new_session_share))
+        self.msisdn_rate = msisdn_rate
+        self.msisdn_burst = msisdn_burst
+        # A bucket idle long enough to refill completely carries no state
+        self._buckets: TTLCache = TTLCache(
+            maxsize=msisdn_tracked, ttl=max(1.0, msisdn_burst / msisdn_rate)
+        )
+        self.inflight = {CALLBACK_PATH: 0, PAYMENT_PATH: 0}
+        self.shed: dict[str, int] = {}
+
+    @property
+    def total_inflight(self) -> int:
+        return self.inflight[CALLBACK_PATH] + self.inflight[PAYMENT_PATH]
+
+    def admit_callback(self, mobile: str | None, sequence: int | None) -> str | None:
+        """Return why the callback is shed, or None to admit it."""
+        limit = self.new_session_limit if sequence == 1 else self.callback_limit
+        if self.total_inflight >= limit:
+            return "new_session" if sequence == 1 else "overload"
+
+        if mobile:
+            bucket = self._buckets.get(mobile)
+            if bucket is None:
+                bucket = RateLimiter(self.msisdn_rate, self.msisdn_burst)
+            # Re-inserting keeps the entry alive while the Mobile is active
+            self._buckets[mobile] = bucket
+            if not bucket.try_acquire():
+                return "rate_limited"
+        return None
+
+    def admit_payment(self) -> str | None:
+        return "overload" if self.total_inflight >= self.max_inflight else None
+
+    def record_shed(self, path: str, reason: str):
+        key = f"{path.rsplit('/', 1)[-1]}:{reason}"
+        self.shed[key] = self.shed.get(key, 0) + 1
+        admission_shed_total.inc(path, reason)
+
+    def stats(self) -> dict:
+        return {
+            "inflight": dict(self.inflight),
+            "limits": {
+                "total": self.max_inflight,
+                "callback": self.callback_limit,
+                "new_session": self.new_session_limit,
+            },
+            "tracked_msisdns": len(self._buckets),
+            "shed": dict(self.shed),
+        }
+
+
+admission = AdmissionController(
+    max_inflight=settings.admission_max_inflight,
+    payment_reserve=settings.admission_payment_reserve,
+    new_session_share=settings.admission_new_session_share,
+    msisdn_rate=settings.admission_msisdn_rate,
+    msisdn_burst=settings.admission_msisdn_burst,
+    msisdn_tracked=settings.admission_msisdn_tracked,
+)
+
+
+async def _read_body(receive) -> tuple[bytes, bool]:
+    """Return the request body and whether it arrived in full."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            return b"".join(chunks), False
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks), True
+
+
+class AdmissionMiddleware:
+    """Sheds /callback and /payment before they reach a handler.
+
+    A shed callback gets a USSD release so the handset shows a message
+    instead of hanging until Hubtel times out; a shed payment gets a 503 so
+    that the webhook is delivered again.
+    """
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path")
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or path not in self.controller.inflight
+            or self.controller.max_inflight <= 0
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if path == PAYMENT_PATH:
+            reason = self.controller.admit_payment()
+            if reason is not None:
+                self.controller.record_shed(path, reason)
+                logger.warning("Shedding payment webhook", reason=reason)
+                response = JSONResponse(
+                    {"detail": "Service overloaded, retry shortly"},
+                    status_code=503,
+                    headers={"Retry-After": "5"},
+                )
+                await response(scope, receive, send)
+                return
+        else:
+            body, complete = await _read_body(receive)
+            if not complete:
+                # The client went away before sending the whole body
+                return
+            try:
+                payload = json.loads(body)
+                session_id = payload.get("SessionId")
+                reason = self.controller.admit_callback(
+                    payload.get("Mobile"), payload.get("Sequence")
+                )
+            except (ValueError, AttributeError, TypeError):
+                # Malformed bodies are left for the route to reject
+                session_id, reason = None, None
+
+            if reason is not None:
+                self.controller.record_shed(path, reason)
+                message = TOO_MANY_REQUESTS if reason == "rate_limited" else SERVICE_BUSY
+                await JSONResponse(release(session_id, message))(scope, receive, send)
+                return
+
+            replayed = False
+            downstream = receive
+
+            async def replay():
+                nonlocal replayed
+                if replayed:
+                    return await downstream()
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+
+            receive = replay
+
+        self.controller.inflight[path] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.inflight[path] -= 1
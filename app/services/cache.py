@@ -0,0 +1,92 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from cachetools import TTLCache
+
+
+class CountingTTLCache(TTLCache):
+    """TTLCache that counts entries dropped to make room for new ones."""
+
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+
+    def popitem(self):
+        self.evictions += 1
+        return super().popitem()
+
+
+class AsyncTTLCache:
+    """Read-through TTL cache that coalesces concurrent misses for a key.
+
+    Exceptions for which ``is_negative`` returns True are cached for
+    ``negative_ttl`` seconds and re-raised to later callers.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        negative_ttl: float = 0,
+        is_negative: Callable[[Exception], bool] | None = None,
+    ):
+        self._values = CountingTTLCache(maxsize=maxsize, ttl=ttl)
+        self._errors = (
+            CountingTTLCache(maxsize=maxsize, ttl=negative_ttl) if negative_ttl else None
+        )
+        self._is_negative = is_negative or (lambda e: False)
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        if key in self._values:
+            self.hits += 1
+            return self._values[key]
+
+        if self._errors is not None and key in self._errors:
+            self.negative_hits += 1
+            raise self._errors[key].with_traceback(None)
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            future = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = future
+
+        # Shield the shared load so one cancelled caller does not fail the rest
+        return await asyncio.shield(future)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        try:
+            value = await loader()
+        except Exception as e:
+            if self._errors is not None and self._is_negative(e):
+                self._errors[key] = e
+            raise
+        else:
+            self._values[key] = value
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, key: Hashable):
+        self._values.pop(key, None)
+        if self._errors is not None:
+            self._errors.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self._values.evictions,
+            "size": len(self._values),
+            "negative_size": len(self._errors) if self._errors is not None else 0,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,68 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from core.config import settings
+
+SIGNATURE_BYTES = 16
+
+# Short keys keep the token small enough for the USSD gateway
+FIELDS = {
+    "meter_number": "m",
+    "customer_name": "n",
+    "mobile": "p",
+    "repeat": "r",
+    "step": "s",
+}
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: bytes) -> bytes:
+    if not settings.client_state_secret:
+        raise RuntimeError("client_state_secret must be set to use stateless sessions")
+    key = settings.client_state_secret.encode()
+    return hmac.new(key, payload, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+
+def encode_client_state(session_id: str, state: dict) -> str:
+    """Pack session state into a signed token that Hubtel echoes back."""
+    compact = {FIELDS[key]: value for key, value in state.items() if key in FIELDS}
+    compact["x"] = int(time.time()) + settings.session_ttl
+    payload = json.dumps(compact, separators=(",", ":")).encode()
+    signature = _sign(session_id.encode() + b"." + payload)
+    return f"{_b64encode(payload)}.{_b64encode(signature)}"
+
+
+def decode_client_state(session_id: str, token: str | None) -> dict | None:
+    """Return the state carried by a token, or None if it is missing, forged or expired."""
+    if not token or "." not in token:
+        return None
+
+    try:
+        encoded_payload, encoded_signature = token.split(".", 1)
+        payload = _b64decode(encoded_payload)
+        signature = _b64decode(encoded_signature)
+    except ValueError:
+        return None
+
+    expected = _sign(session_id.encode() + b"." + payload)
+    if not hmac.compare_digest(signature, expected):
+        return None
+
+    try:
+        compact = json.loads(payload)
+    except ValueError:
+        return None
+    if compact.get("x", 0) < time.time():
+        return None
+
+    return {key: compact[short] for key, short in FIELDS.items() if short in compact}
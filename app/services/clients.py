@@ -0,0 +1,96 @@
+import ssl
+from functools import cache
+
+from httpx import AsyncClient, Limits, Timeout, create_ssl_context
+from loguru import logger
+
+from core.config import settings
+
+UPSTREAM_TIMEOUTS = {
+    "laison": lambda: settings.laison_timeout,
+    "hubtel": lambda: settings.hubtel_timeout,
+    "otlp": lambda: settings.trace_otlp_timeout,
+}
+
+_clients: dict[str, AsyncClient] = {}
+_request_counts: dict[str, int] = {}
+_http2_enabled: dict[str, bool] = {}
+
+
+def _http2_available() -> bool:
+    if not settings.http2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed")
+        return False
+    return True
+
+
+@cache
+def ssl_context() -> ssl.SSLContext:
+    """One context for every client; loading the CA bundle is most of a client's cost."""
+    return create_ssl_context()
+
+
+def _build_client(name: str) -> AsyncClient:
+    limits = Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+    # Per-endpoint clients are named "<upstream>:<index>"
+    timeout = Timeout(UPSTREAM_TIMEOUTS[name.split(":")[0]]())
+
+    async def count_request(request):
+        _request_counts[name] = _request_counts.get(name, 0) + 1
+
+    _http2_enabled[name] = _http2_available()
+    return AsyncClient(
+        limits=limits,
+        timeout=timeout,
+        http2=_http2_enabled[name],
+        verify=ssl_context(),
+        event_hooks={"request": [count_request]},
+    )
+
+
+def get_client(name: str) -> AsyncClient:
+    """Return the shared client for an upstream, creating it on first use."""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = _build_client(name)
+    return client
+
+
+async def start_clients(names: list[str] | None = None):
+    for name in names or UPSTREAM_TIMEOUTS:
+        get_client(name)
+    logger.info("HTTP client pools started", clients=list(_clients))
+
+
+async def close_clients():
+    for name, client in list(_clients.items()):
+        await client.aclose()
+        del _clients[name]
+    logger.info("HTTP client pools closed")
+
+
+def pool_stats() -> dict:
+    stats = {}
+    for name, client in _clients.items():
+        # httpx does not expose pool state publicly, so read it best-effort
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for conn in connections if conn.is_idle())
+        stats[name] = {
+            "requests": _request_counts.get(name, 0),
+            "connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "max_connections": settings.http_max_connections,
+            "max_keepalive_connections": settings.http_max_keepalive_connections,
+            "http2": _http2_enabled.get(name, False),
+        }
+    return stats
@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import threading
+import weakref
+
+_databases: "weakref.WeakSet[Database]" = weakref.WeakSet()
+
+
+class Database:
+    """SQLite connection in WAL mode, opened on first use in each process.
+
+    A connection must not be used on both sides of a fork(), so a preforked
+    worker opens its own rather than inheriting one from the parent, and a
+    process that never touches the store never opens it.
+    """
+
+    def __init__(self, path: str, schema: tuple[str, ...] = ()):
+        self.path = path
+        self.schema = schema
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._open_lock = threading.Lock()
+        _databases.add(self)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            with self._open_lock:
+                if self._pid != os.getpid():
+                    conn = sqlite3.connect(
+                        self.path, check_same_thread=False, isolation_level=None
+                    )
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    for statement in self.schema:
+                        conn.execute(statement)
+                    self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def close(self):
+        # An inherited connection belongs to the parent and is left alone
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = self._pid = None
+
+
+def open_databases():
+    """Open every store in this process now rather than on its first request."""
+    for database in list(_databases):
+        database.conn
@@ -3,20 +3,13 @@ import binascii
 
 from loguru import logger  # Import the logger from main
 
-class AESProcessor:
-    def __init__(self):
-        # AES encryption logic would go here
-        pass
-    
-    def encrypt(self, data, key):
-        cipher = AES.new(key, AES.MODE_ECB)
-        return cipher.encrypt(data)
-
 class PaymentEncryption:
     CONST_AES_KEY_BYTES = 16
     
     def __init__(self, root_key):
         self.m_rootkey = binascii.unhexlify(root_key)
+        # ECB keeps no state between calls, so the root key schedule is built once
+        self.m_root_cipher = AES.new(self.m_rootkey, AES.MODE_ECB)
         
     def ascii_to_16_bytes(self, raw_str):
         if not raw_str:
@@ -50,30 +43,54 @@ class PaymentEncryption:
     
     def generate_purchase_string(self, transaction_id, payment):
         """Generate purchase string from transaction ID and payment amount"""
-        # Convert transaction ID to bytes
+        # Convert transaction ID to bytes and encrypt it using root key
         transid_bytes = self.ascii_to_16_bytes(transaction_id)
-        logger.debug(f"Transaction ID: {self.bytes_to_hex_string(transid_bytes)}")
-        
-        # Encrypt transaction ID using root key
-        aes = AESProcessor()
-        encrypted_transaction = aes.encrypt(transid_bytes, self.m_rootkey)
-        logger.debug(f"Encrypted transaction ID: {self.bytes_to_hex_string(encrypted_transaction)}")
-        
+        encrypted_transaction = self.m_root_cipher.encrypt(transid_bytes)
+        return self._purchase_string(transid_bytes, encrypted_transaction, payment)
+
+    def generate_purchase_strings(self, batch):
+        """Generate purchase strings for many (transaction ID, payment) pairs.
+
+        The transaction IDs go through the root key in one ECB call, but each
+        payment still needs a cipher keyed by its encrypted ID, and building
+        those dominates: this is no faster than generate_purchase_string in a
+        loop.
+        """
+        batch = list(batch)
+        if not batch:
+            return []
+
+        transid_blocks = [self.ascii_to_16_bytes(transaction_id) for transaction_id, _ in batch]
+        encrypted = self.m_root_cipher.encrypt(b"".join(transid_blocks))
+        size = self.CONST_AES_KEY_BYTES
+
+        return [
+            self._purchase_string(
+                transid_bytes, encrypted[index * size:(index + 1) * size], payment
+            )
+            for index, (transid_bytes, (_, payment)) in enumerate(zip(transid_blocks, batch))
+        ]
+
+    def _purchase_string(self, transid_bytes, encrypted_transaction, payment):
         # Convert payment to string with 2 decimal places
-        payment_str = f"{payment:.2f}"
-        payment_bytes = self.ascii_to_16_bytes(payment_str)
-        logger.debug(f"Payment: {self.bytes_to_hex_string(payment_bytes)}")
-        
+        payment_bytes = self.ascii_to_16_bytes(f"{payment:.2f}")
+
         # Encrypt payment using encrypted transaction ID as key
-        purchase_bytes = aes.encrypt(payment_bytes, encrypted_transaction)
-        logger.debug(f"Encrypted purchase parameter: {self.bytes_to_hex_string(purchase_bytes)}")
-        
+        purchase_bytes = AES.new(encrypted_transaction, AES.MODE_ECB).encrypt(payment_bytes)
+
         # Convert to hex string
         hex_str = self.bytes_to_hex_string(purchase_bytes)
-        logger.debug(f"Purchase string: {hex_str}")
-        
-        return hex_str
 
+        # Hex conversions only run when debug logging is enabled
+        logger.opt(lazy=True).debug(
+            "Transaction ID: {} | Encrypted transaction ID: {} | Payment: {} | Purchase string: {}",
+            lambda: self.bytes_to_hex_string(transid_bytes),
+            lambda: self.bytes_to_hex_string(encrypted_transaction),
+            lambda: self.bytes_to_hex_string(payment_bytes),
+            lambda: hex_str,
+        )
+
+        return hex_str
 
 if __name__ == "__main__":
   test = PaymentEncryption('DCC78B3DAC5CA7409A01F45D81106753')
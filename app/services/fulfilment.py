@@ -0,0 +1,205 @@
+import asyncio
+
+from loguru import logger
+
+from core.config import settings
+from core.tracing import traced
+from services.hubtel import hubtel_confirmation
+from services.laison import get_payment_token
+from services.ledger import ledger
+from services.queue import JobQueue
+from services.sms import ERROR, TOKEN, SmsMessage, sms_dispatcher
+
+
+def build_order(
+    session_id: str,
+    order_id: str,
+    meter_number: str,
+    amount: float,
+    customer_number: str,
+    mobile: str | None = None,
+) -> dict:
+    """Everything the fulfilment stages need, captured when the webhook arrives.
+
+    ``customer_number`` is the paying wallet from the webhook, which gets the
+    token SMS; ``mobile`` is the number that dialled the USSD session.
+    """
+    return {
+        "session_id": session_id,
+        "order_id": order_id,
+        "meter_number": meter_number,
+        "amount": amount,
+        "customer_number": customer_number,
+        "mobile": mobile,
+        "token_status": None,
+        "token_message": None,
+        "sms_sent": False,
+        "confirmed": False,
+    }
+
+
+@traced("fulfilment.order", trace_key="order.session_id", attributes=("order.order_id",))
+async def fulfil_order(order: dict, on_progress=None):
+    """Run token -> (SMS, confirmation), skipping stages that already completed.
+
+    Progress is recorded in the ledger, and ``on_progress`` is awaited, after
+    each stage completes so that a retry resumes where the last attempt
+    stopped.
+    """
+
+    async def save():
+        await ledger.record(order)
+        if on_progress is not None:
+            await on_progress(order)
+
+    if order["token_status"] is None:
+        status, message = await get_payment_token(
+            transaction_id=order["order_id"][:16],
+            meter_number=order["meter_number"],
+            payment=order["amount"],
+            # Keyed as the resend menu looks it up; orders queued before the
+            # USSD Mobile was recorded only have the paying number
+            mobile=order.get("mobile") or order["customer_number"],
+        )
+        logger.info("Payment token generated", order_id=order["order_id"], status=status)
+        order["token_status"], order["token_message"] = status, message
+        await save()
+
+    async def sms():
+        if not order["sms_sent"]:
+            await sms_dispatcher.send(
+                SmsMessage(
+                    message=order["token_message"],
+                    customer_number=order["customer_number"],
+                    session_id=order["session_id"],
+                    order_id=order["order_id"],
+                    meter_number=order["meter_number"],
+                ),
+                priority=TOKEN if order["token_status"] == "success" else ERROR,
+            )
+            order["sms_sent"] = True
+            await save()
+
+    async def confirmation():
+        if not order["confirmed"]:
+            await hubtel_confirmation(
+                session_id=order["session_id"],
+                order_id=order["order_id"],
+                status=order["token_status"],
+            )
+            order["confirmed"] = True
+            await save()
+
+    # The SMS and the confirmation only depend on the token, not on each other
+    results = await asyncio.gather(sms(), confirmation(), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    return order
+
+
+class FulfilmentWorker:
+    """Drains the durable fulfilment queue, running up to ``workers`` jobs at once.
+
+    A single loop claims jobs for as long as a slot is free, so a slow upstream
+    call holds one slot rather than stalling the claims behind it.
+    """
+
+    def __init__(self, queue: JobQueue):
+        self.queue = queue
+        self._dispatcher: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._slots: asyncio.Semaphore | None = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    async def submit(self, order: dict) -> bool:
+        created = await self.queue.enqueue(order["order_id"], order)
+        self._wakeup.set()
+        return created
+
+    def start(self, workers: int):
+        self._stopping = False
+        self._slots = asyncio.Semaphore(workers)
+        self._dispatcher = asyncio.create_task(self._run())
+        logger.info("Started fulfilment workers", workers=workers)
+
+    async def stop(self):
+        # wait_for() can swallow a cancellation on Python < 3.12, so the
+        # flag makes sure the loop exits either way
+        self._stopping = True
+        self._wakeup.set()
+        tasks = [self._dispatcher, *self._tasks] if self._dispatcher else [*self._tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+        self._tasks.clear()
+
+    async def _run(self):
+        while not self._stopping:
+            await self._slots.acquire()
+            # Cleared before claiming, so that a submit() landing while the
+            # claim runs still wakes the wait below
+            self._wakeup.clear()
+            try:
+                job = await self.queue.claim()
+            except Exception as e:
+                logger.error("Failed to claim fulfilment job", error=str(e))
+                job = None
+
+            if job is None:
+                self._slots.release()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=settings.fulfilment_poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._process(*job))
+            self._tasks.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._slots.release()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Fulfilment job failed", error=str(task.exception()))
+
+    async def _process(self, order_id: str, order: dict, attempt: int):
+        async def save(order):
+            await self.queue.save(order_id, order)
+
+        try:
+            await fulfil_order(order, on_progress=save)
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e)
+            if attempt >= settings.fulfilment_max_attempts:
+                logger.error(
+                    "Giving up on order", order_id=order_id, attempts=attempt, error=error
+                )
+                await self.queue.fail(order_id, error)
+                return
+
+            delay = min(
+                settings.fulfilment_retry_base * 2 ** (attempt - 1),
+                settings.fulfilment_retry_max,
+            )
+            logger.warning(
+                "Fulfilment attempt failed",
+                order_id=order_id,
+                attempt=attempt,
+                error=error,
+                retry_in=round(delay, 1),
+            )
+            await self.queue.retry(order_id, error, delay)
+            return
+
+        logger.info("Fulfilment completed", order_id=order_id)
+        await self.queue.complete(order_id)
+
+
+fulfilment_worker = FulfilmentWorker(JobQueue(settings.fulfilment_db))
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class LatencyWindow:
+    """Recent latencies of one operation, used to pick the hedge delay."""
+
+    def __init__(self, size: int = 512):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def record(self, latency: float):
+        self._samples.append(latency)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p: float) -> float:
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class HedgeBudget:
+    """Token bucket that caps hedges to a fraction of requests."""
+
+    def __init__(self, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self.requests = 0
+        self.hedges = 0
+
+    def on_request(self):
+        self.requests += 1
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        self.hedges += 1
+        return True
+
+
+class Hedger:
+    """Sends a second copy of an idempotent request when the first is slower
+    than the recent ``percentile`` latency; the first response wins."""
+
+    def __init__(self, percentile: float, budget: float, min_delay: float, min_samples: int):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.latencies = LatencyWindow()
+        self.budget = HedgeBudget(budget)
+        self.hedge_wins = 0
+
+    def delay(self) -> float | None:
+        if len(self.latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latencies.percentile(self.percentile))
+
+    async def _timed(self, send: Callable[[], Awaitable[T]]) -> T:
+        start = time.monotonic()
+        result = await send()
+        self.latencies.record(time.monotonic() - start)
+        return result
+
+    async def run(self, send: Callable[[], Awaitable[T]]) -> T:
+        self.budget.on_request()
+        primary = asyncio.ensure_future(self._timed(send))
+        delay = self.delay()
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self.budget.try_spend():
+            return await primary
+
+        hedge = asyncio.ensure_future(self._timed(send))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+            # Both copies failed
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.budget.requests,
+            "hedges": self.budget.hedges,
+            "hedge_wins": self.hedge_wins,
+            "delay": self.delay(),
+        }
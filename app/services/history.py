@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+
+from cachetools import LRUCache
+
+from core.config import settings
+from core.flow import normalise_mobile
+from services.database import Database
+
+
+@dataclass(frozen=True, slots=True)
+class LastPurchase:
+    meter_number: str
+    customer_name: str
+    amount: float
+
+
+class PurchaseHistory:
+    """Last successful purchase per Mobile, for the repeat top-up menu.
+
+    Lookups are served from a bounded in-memory LRU; SQLite keeps the
+    history across restarts and is read on a miss, so a purchase recorded
+    by another process is found too.
+    """
+
+    def __init__(self, path: str, maxsize: int):
+        self._recent = LRUCache(maxsize=max(1, maxsize))
+        self._db_lock = threading.Lock()
+        self._db = Database(
+            path,
+            schema=(
+                """
+                CREATE TABLE IF NOT EXISTS purchase_history (
+                    mobile TEXT PRIMARY KEY,
+                    meter_number TEXT NOT NULL,
+                    customer_name TEXT NOT NULL,
+                    amount REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """,
+            ),
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, mobile: str) -> LastPurchase | None:
+        with self._db_lock:
+            row = self._db.conn.execute(
+                "SELECT meter_number, customer_name, amount FROM purchase_history "
+                "WHERE mobile = ?",
+                (mobile,),
+            ).fetchone()
+        return LastPurchase(*row) if row is not None else None
+
+    def _put(self, mobile: str, purchase: LastPurchase):
+        with self._db_lock:
+            self._db.conn.execute(
+                "INSERT INTO purchase_history "
+                "(mobile, meter_number, customer_name, amount, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (mobile) DO UPDATE SET "
+                "meter_number = excluded.meter_number, "
+                "customer_name = excluded.customer_name, "
+                "amount = excluded.amount, updated_at = excluded.updated_at",
+                (
+                    mobile,
+                    purchase.meter_number,
+                    purchase.customer_name,
+                    purchase.amount,
+                    time.time(),
+                ),
+            )
+
+    async def get(self, mobile: str) -> LastPurchase | None:
+        mobile = normalise_mobile(mobile)
+        purchase = self._recent.get(mobile)
+        if purchase is None:
+            purchase = await asyncio.to_thread(self._get, mobile)
+            if purchase is None:
+                self.misses += 1
+                return None
+            self._recent[mobile] = purchase
+        self.hits += 1
+        return purchase
+
+    async def record(self, mobile: str, purchase: LastPurchase):
+        mobile = normalise_mobile(mobile)
+        self._recent[mobile] = purchase
+        await asyncio.to_thread(self._put, mobile, purchase)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._recent),
+            "maxsize": self._recent.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+purchase_history = PurchaseHistory(settings.fulfilment_db, settings.purchase_history_size)
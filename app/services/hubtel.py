@@ -1,6 +1,5 @@
 from fastapi import HTTPException
 from httpx import (
-    AsyncClient,
     TimeoutException,
     HTTPStatusError,
     ConnectError,
@@ -10,8 +9,12 @@ from loguru import logger
 
 from core.config import settings
 from core.schema import HubtelCallBackRequest
+from core.tracing import traced
+from services.clients import get_client
+from services.resilience import guarded
 
 
+@traced("hubtel.sms", trace_key="session_id", attributes=("order_id",))
 async def send_customer_sms(
     message: str,
     customer_number: str,
@@ -19,10 +22,7 @@ async def send_customer_sms(
     order_id: str,
     meter_number: str,
 ):
-    logger.info(
-        f"Initiating Hubtel SMS request for Session: {session_id}, Order: {order_id}, meter_number: {meter_number}\n"
-        f"URL: {settings.hubtel_sms}\n"
-    )
+    log = logger.bind(session_id=session_id, order_id=order_id, meter_number=meter_number)
 
     params = {
         "clientid": settings.client_id,
@@ -33,36 +33,36 @@ async def send_customer_sms(
     }
 
     try:
-        logger.info(f"Sending SMS to {customer_number} with message: {message}")
+        # The content carries the token, so only its size is logged
+        log.info("Sending SMS", to=customer_number, length=len(message))
 
-        async with AsyncClient() as client:
-            res = await client.get(
+        res = await guarded(
+            "hubtel",
+            "sms",
+            lambda: get_client("hubtel").get(
                 url=settings.hubtel_sms,
                 params=params,
-            )
+            ),
+        )
 
         # Check if the response status is not 2xx
         if not 200 <= res.status_code < 300:
-            logger.error(
-                f"Failed to send SMS. Status Code: {res.status_code}, Response: {res.text}"
-            )
+            log.error("Failed to send SMS", status_code=res.status_code, response=res.text)
             raise HTTPException(
                 status_code=res.status_code, detail="Failed to send SMS."
             )
 
-        logger.info(
-            f"SMS sent successfully. Status Code: {res.status_code}, Response: {res.json()}"
-        )
+        log.info("SMS sent", status_code=res.status_code)
 
     except TimeoutException:
-        logger.error("Timeout occurred while trying to send the SMS.")
+        log.error("Timeout occurred while trying to send the SMS")
         raise HTTPException(status_code=504, detail="Timeout while sending SMS.")
     except ConnectError:
-        logger.error("Connection error occurred while sending SMS.")
+        log.error("Connection error occurred while sending SMS")
         raise HTTPException(status_code=503, detail="Failed to connect to SMS service.")
     except HTTPStatusError as e:
-        logger.error(
-            f"HTTP status error: {e.response.status_code}, Response: {e.response.text}"
+        log.error(
+            "HTTP status error", status_code=e.response.status_code, response=e.response.text
         )
         raise HTTPException(
             status_code=e.response.status_code, detail="Error in SMS service response."
@@ -73,13 +73,52 @@ async def send_customer_sms(
             detail=f"{e.detail}",
         )
     except RequestError as e:
-        logger.error(f"Request error: {str(e)}")
+        log.error("Request error", error=str(e))
         raise HTTPException(status_code=400, detail="Failed to send SMS request.")
     except Exception as e:
-        logger.error(f"Unexpected error occurred: {str(e)}")
+        log.error("Unexpected error occurred", error=str(e))
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
 
+async def send_sms_batch(recipients: list[dict]):
+    """Send personalised messages in one request to the batch SMS endpoint.
+
+    ``recipients`` is a list of {"To": ..., "Content": ...} dicts.
+    """
+    body = {"From": "NUMA", "personalisedRecipients": recipients}
+
+    try:
+        logger.info("Sending SMS batch", size=len(recipients))
+
+        res = await guarded(
+            "hubtel",
+            "sms",
+            lambda: get_client("hubtel").post(
+                url=settings.hubtel_sms_batch,
+                json=body,
+                auth=(settings.client_id, settings.client_secret),
+            ),
+        )
+
+        if not 200 <= res.status_code < 300:
+            logger.error(
+                "Failed to send SMS batch", status_code=res.status_code, response=res.text
+            )
+            raise HTTPException(
+                status_code=res.status_code, detail="Failed to send SMS batch."
+            )
+
+    except HTTPException:
+        raise
+    except TimeoutException:
+        logger.error("Timeout occurred while trying to send the SMS batch")
+        raise HTTPException(status_code=504, detail="Timeout while sending SMS batch.")
+    except RequestError as e:
+        logger.error("Request error", error=str(e))
+        raise HTTPException(status_code=503, detail="Failed to send SMS batch request.")
+
+
+@traced("hubtel.confirmation", trace_key="session_id", attributes=("order_id",))
 async def hubtel_confirmation(session_id: str, order_id: str, status: str):
     headers = {
         "Connection": settings.connection,
@@ -92,47 +131,47 @@ async def hubtel_confirmation(session_id: str, order_id: str, status: str):
         SessionId=session_id, OrderId=order_id, ServiceStatus=status
     )
 
+    log = logger.bind(session_id=session_id, order_id=order_id)
+
     try:
-        logger.info(
-            f"Initiating Hubtel confirmation request for Session: {session_id}, Order: {order_id}, Status: {status}\n"
-            f"URL: {settings.hubtel_fulfillment}\n"
-            f"Headers: {headers}\n"
-            f"Request Body: {body.model_dump()}"
-        )
+        log.info("Sending Hubtel confirmation", status=status)
 
-        async with AsyncClient() as client:
-            res = await client.post(
+        res = await guarded(
+            "hubtel",
+            "confirmation",
+            lambda: get_client("hubtel").post(
                 url=settings.hubtel_fulfillment,
                 data=body.model_dump(),
                 headers=headers,
-            )
+            ),
+        )
 
         # Check if the response status is not 2xx
         if not 200 <= res.status_code < 300:
-            logger.error(
-                f"Failed to confirm transaction. Status Code: {res.status_code}, Response: {res.text}"
+            log.error(
+                "Failed to confirm transaction", status_code=res.status_code, response=res.text
             )
             raise HTTPException(
                 status_code=res.status_code, detail="Failed to confirm transaction."
             )
 
-        logger.info(
-            f"Transaction confirmed successfully. Status Code: {res.status_code}, Response: {res.text}"
-        )
+        log.info("Transaction confirmed", status_code=res.status_code)
 
     except TimeoutException:
-        logger.error("Timeout occurred during Hubtel confirmation.")
+        log.error("Timeout occurred during Hubtel confirmation")
         raise HTTPException(
             status_code=504, detail="Timeout while confirming with Hubtel."
         )
     except ConnectError:
-        logger.error("Connection error occurred during Hubtel confirmation.")
+        log.error("Connection error occurred during Hubtel confirmation")
         raise HTTPException(
             status_code=503, detail="Failed to connect to Hubtel service."
         )
     except HTTPStatusError as e:
-        logger.error(
-            f"HTTP status error during confirmation: {e.response.status_code}, Response: {e.response.text}"
+        log.error(
+            "HTTP status error during confirmation",
+            status_code=e.response.status_code,
+            response=e.response.text,
         )
         raise HTTPException(
             status_code=e.response.status_code,
@@ -144,12 +183,12 @@ async def hubtel_confirmation(session_id: str, order_id: str, status: str):
             detail=f"{e.detail}",
         )
     except RequestError as e:
-        logger.error(f"Request error during Hubtel confirmation: {str(e)}")
+        log.error("Request error during Hubtel confirmation", error=str(e))
         raise HTTPException(
             status_code=400, detail="Failed to send confirmation request."
         )
     except Exception as e:
-        logger.error(f"Unexpected error occurred during Hubtel confirmation: {str(e)}")
+        log.error("Unexpected error occurred during Hubtel confirmation", error=str(e))
         raise HTTPException(
             status_code=500,
             detail="An unexpected error occurred. Please try again later.",
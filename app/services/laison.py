@@ -1,123 +1,147 @@
 from fastapi import HTTPException, Path
-from httpx import AsyncClient
 from loguru import logger
 
 from core.messages import PURCHASE_ERROR_MESSAGES, TOKEN_ERROR_MESSAGES
 from core.config import settings
+from core.flow import InvalidInput
+from core.tracing import span, traced
+from services.cache import AsyncTTLCache
 from services.encryption import PaymentEncryption
+from services.hedging import Hedger
+from services.lapis import CustomerQuery, PurchaseRequest, format_tokens, lapis
+from services.meter_filter import check_meter_number
+from services.resilience import ServiceBusy
+from services.vault import token_vault
 
-payment_encryption = PaymentEncryption(root_key=settings.root_key)
-
-
-async def parse_query_response(res: str) -> dict:
-    pairs = res.split("&")
-    result = {
-        pair.split("=")[0]: pair.split("=")[1] for pair in pairs if pair.split("=")[0]
-    }
-    return result
+# Lookups for these codes are cached briefly so that typos don't hammer LAPIS
+NEGATIVE_CACHE_ERRORS = {PURCHASE_ERROR_MESSAGES["10"], PURCHASE_ERROR_MESSAGES["11"]}
 
-
-async def parse_token_list(token_list: str) -> str:
-    left = 0
-    right = 4
-    res = []
-    while left < 20:
-        res.append(token_list[left:right])
-        left += 4
-        right += 4
-
-    return " ".join(res)
+payment_encryption = PaymentEncryption(root_key=settings.root_key)
+customer_cache = AsyncTTLCache(
+    maxsize=settings.customer_cache_maxsize,
+    ttl=settings.customer_cache_ttl,
+    negative_ttl=settings.customer_negative_ttl,
+    is_negative=lambda e: isinstance(e, HTTPException)
+    and e.detail in NEGATIVE_CACHE_ERRORS,
+)
+lookup_hedger = Hedger(
+    percentile=settings.hedge_percentile,
+    budget=settings.hedge_budget,
+    min_delay=settings.hedge_min_delay,
+    min_samples=settings.hedge_min_samples,
+)
+
+
+@traced("laison.customer_lookup", attributes=("meter_number",))
+async def get_customer_name(meter_number: str) -> str:
+    return await customer_cache.get_or_load(
+        meter_number, lambda: _query_customer_name(meter_number)
+    )
 
 
-async def get_customer_by_meter_number(meter_number: str = Path(..., min_length=13)):
-    logger.info(f"Fetching customer data for meter number: {meter_number}")
-    headers = {"Connection": settings.connection}
-    params = {
-        "function": "querycustomerbymeternumber",
-        "meternumber": meter_number,
-        "platformid": 1783072172428754944,
-    }
+async def _query_customer_name(meter_number: str) -> str:
+    log = logger.bind(meter_number=meter_number)
+    log.info("Fetching customer data", sampled=True)
     try:
-        async with AsyncClient() as client:
-            res = await client.get(
-                url=settings.laison_url,
-                params=params,
-                headers=headers,
-            )
-        data = await parse_query_response(res.text)
-        error_code = data.get("errorcode")
+        query = CustomerQuery(meter_number)
+        # Only this read-only lookup is hedged, never a purchase
+        if settings.laison_hedging:
+            result = await lookup_hedger.run(lambda: lapis.query_customer(query))
+        else:
+            result = await lapis.query_customer(query)
+        error_code = result.errorcode
 
-        if error_code == "0":
-            logger.info(f"Customer found: {data['customername']}")
-            return f"You have requested to top up {meter_number} {data['customername'].upper()}. \n\nEnter top up amount:"
+        if result.ok:
+            log.info("Customer found", sampled=True)
+            return result.customer_name
 
         if PURCHASE_ERROR_MESSAGES.get(error_code):
-            logger.error(f"Query error: {PURCHASE_ERROR_MESSAGES.get(error_code)}")
+            log.error("Query error", error_code=error_code)
             raise HTTPException(
                 status_code=400,  # Client error
                 detail=PURCHASE_ERROR_MESSAGES.get(error_code),
             )
         else:
-            logger.error(f"Unknown error occurred: {data}")
+            log.error("Unknown error occurred", response=result.fields)
             raise HTTPException(
-                status_code=500, detail=f"Unknown error occurred: {data}"
+                status_code=500, detail=f"Unknown error occurred: {result.fields}"
             )
 
+    except ServiceBusy:
+        log.error("LAPIS is busy, failing fast")
+        raise
     except HTTPException as hx:
-        logger.error(f"HTTP error: {hx.detail}")
+        log.error("HTTP error", error=hx.detail)
         raise HTTPException(
             status_code=hx.status_code,
             detail=f"{hx.detail}",
         )
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+        log.error("Unexpected error", error=str(e))
         raise HTTPException(
             status_code=500,
             detail="An unexpected error occurred.",
         )
 
 
+def format_customer_prompt(meter_number: str, customer_name: str) -> str:
+    return f"You have requested to top up {meter_number} {customer_name.upper()}. \n\nEnter top up amount:"
+
+
+async def get_customer_by_meter_number(meter_number: str = Path(..., min_length=13)):
+    # Path() is only enforced when FastAPI calls this as a route
+    try:
+        meter_number = check_meter_number(meter_number)
+    except InvalidInput as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    customer_name = await get_customer_name(meter_number)
+    return format_customer_prompt(meter_number, customer_name)
+
+
+@traced("laison.get_payment_token", attributes=("meter_number",))
 async def get_payment_token(
     payment: float,
     transaction_id: str,
     meter_number: str,
+    mobile: str | None = None,
 ):
-    logger.info(
-        f"Generating payment token for meter: {meter_number}, transaction: {transaction_id}, payment: {payment}"
-    )
+    log = logger.bind(meter_number=meter_number, order_id=transaction_id)
+    log.info("Generating payment token", amount=payment)
     try:
-        purchase_param = payment_encryption.generate_purchase_string(
-            transaction_id=transaction_id, payment=payment
-        )
-
-        headers = {"Connection": settings.connection}
-        body = {
-            "operatetype": "purchasebytransid",
-            "transid": transaction_id,
-            "meternumber": meter_number,
-            "platformid": 1783072172428754944,
-            "purchaseparam": purchase_param,
-        }
-
-        async with AsyncClient() as client:
-            res = await client.post(
-                url=settings.laison_url,
-                data=body,
-                headers=headers,
+        with span("encryption.generate_purchase_string"):
+            purchase_param = payment_encryption.generate_purchase_string(
+                transaction_id=transaction_id, payment=payment
             )
-        data = await parse_query_response(res.text)
+
+        result = await lapis.purchase(
+            PurchaseRequest(transaction_id, meter_number, purchase_param)
+        )
         status = "success"
 
-        error_code = data.get("errorcode")
-        if error_code == "0":
-            token_list = await parse_token_list(data.get("tokenlist"))
-            logger.info(f"Payment successful for transaction ID: {transaction_id}")
+        error_code = result.errorcode
+        if result.ok:
+            log.info("Payment token issued", tokens=len(result.tokens))
+            if not result.tokens:
+                log.warning("LAPIS reported success without a token", response=result.fields)
+            elif settings.token_vault:
+                try:
+                    await token_vault.store(
+                        transaction_id,
+                        meter_number,
+                        mobile,
+                        result.tokens,
+                        result.recharge_amount,
+                        result.recharge_volume,
+                    )
+                except Exception as e:
+                    # The purchase went through; losing the copy must not fail it
+                    log.warning("Failed to store token in vault", error=str(e))
             message = (
                 f"Thank you for your purchase!\n"
                 f"Transaction ID: {transaction_id}\n"
-                f"Recharge Amount: GHC{data.get('rechargeamount')}\n"
-                f"Recharge Volume: {data.get('rechargevolume')} \n"
-                f"Token: {token_list}\n\n"
+                f"Recharge Amount: GHC{result.recharge_amount}\n"
+                f"Recharge Volume: {result.recharge_volume} \n"
+                f"{format_tokens(result.tokens)}\n\n"
                 f"For more information, please contact: {settings.customer_care}\n"
                 "Thank you for choosing our service!"
             )
@@ -125,7 +149,7 @@ async def get_payment_token(
 
         if int(error_code) < 19:
             status = "failed"
-        logger.error(f"Payment error: {TOKEN_ERROR_MESSAGES[error_code]}")
+        log.error("Payment error", error_code=error_code, error=TOKEN_ERROR_MESSAGES[error_code])
 
         message = (
             f"Thank you for your purchase! An Error occured while processing you transaction.\n"
@@ -135,14 +159,17 @@ async def get_payment_token(
         )
         return status, message
 
+    except ServiceBusy:
+        log.error("LAPIS is busy, failing fast")
+        raise
     except HTTPException as hx:
-        logger.error(f"HTTP error: {hx.detail}")
+        log.error("HTTP error", error=hx.detail)
         raise HTTPException(
             status_code=hx.status_code,
             detail=f"{hx.detail}.",
         )
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+        log.error("Unexpected error", error=str(e))
         raise HTTPException(
             status_code=500,
             detail="An unexpected error occurred.",
@@ -0,0 +1,184 @@
+"""Typed client for the LAPIS vending API.
+
+LAPIS answers every call with an ``errorcode=0&key=value&...`` body. The
+client builds the request for an operation, sends it through the endpoint
+pool and decodes the answer into a typed result. Mapping errorcodes to
+customer messages stays with the caller.
+"""
+
+import re
+from dataclasses import dataclass
+from urllib.parse import unquote_plus
+
+from loguru import logger
+
+from core.config import settings
+from core.metrics import lapis_error_codes_total
+from services.routing import EndpointPool, laison_pool
+
+# An STS token is 20 digits, shown to the customer in groups of four
+TOKEN_LENGTH = 20
+TOKEN_GROUP = 4
+# Between tokens; spaces and dashes only group the digits of one token
+_TOKEN_SEPARATOR = re.compile(r"[,;|]")
+_TOKEN_FORMATTING = re.compile(r"[\s-]")
+_DIGITS = re.compile(r"[0-9]+")
+_GROUP = re.compile(rf".{{1,{TOKEN_GROUP}}}")
+
+
+def decode_response(body: str) -> dict[str, str]:
+    """Decode ``key=value&...`` in one pass over the pairs.
+
+    Values may contain ``=`` and are URL-decoded only when they need it.
+    """
+    # Values are only inspected when something in the answer is encoded
+    encoded = "%" in body or "+" in body
+    result = {}
+    for pair in body.strip().split("&"):
+        key, _, value = pair.partition("=")
+        if key:
+            result[key] = (
+                unquote_plus(value) if encoded and ("%" in value or "+" in value) else value
+            )
+    return result
+
+
+def parse_tokens(token_list: str | None) -> list[str]:
+    """Split a tokenlist into 20-digit tokens.
+
+    Tokens are separated by commas, semicolons or pipes, or arrive back to
+    back. Anything that is not a whole number of tokens is logged and
+    dropped, so a fragment is never sent to a customer as a token.
+    """
+    if not token_list:
+        return []
+    tokens = []
+    for piece in _TOKEN_SEPARATOR.split(token_list):
+        if piece.isascii() and piece.isdigit():
+            digits = piece
+        else:
+            digits = _TOKEN_FORMATTING.sub("", piece)
+            if not digits:
+                continue
+            if not _DIGITS.fullmatch(digits):
+                digits = ""
+        if not digits or len(digits) % TOKEN_LENGTH:
+            logger.warning("Dropped malformed token from tokenlist", length=len(piece))
+            continue
+        if len(digits) == TOKEN_LENGTH:
+            tokens.append(digits)
+        else:
+            tokens.extend(
+                digits[start : start + TOKEN_LENGTH]
+                for start in range(0, len(digits), TOKEN_LENGTH)
+            )
+    return tokens
+
+
+def format_token(token: str) -> str:
+    return " ".join(_GROUP.findall(token))
+
+
+def format_tokens(tokens: list[str]) -> str:
+    if len(tokens) == 1:
+        return f"Token: {format_token(tokens[0])}"
+    return "Tokens:\n" + "\n".join(
+        f"{index}. {format_token(token)}" for index, token in enumerate(tokens, 1)
+    )
+
+
+@dataclass(slots=True)
+class CustomerQuery:
+    meter_number: str
+
+    def params(self, platform_id: str) -> dict:
+        return {
+            "function": "querycustomerbymeternumber",
+            "meternumber": self.meter_number,
+            "platformid": platform_id,
+        }
+
+
+@dataclass(slots=True)
+class PurchaseRequest:
+    transaction_id: str
+    meter_number: str
+    purchase_param: str
+
+    def form(self, platform_id: str) -> dict:
+        return {
+            "operatetype": "purchasebytransid",
+            "transid": self.transaction_id,
+            "meternumber": self.meter_number,
+            "platformid": platform_id,
+            "purchaseparam": self.purchase_param,
+        }
+
+
+@dataclass(slots=True)
+class CustomerResult:
+    errorcode: str | None
+    customer_name: str | None
+    fields: dict[str, str]
+
+    @property
+    def ok(self) -> bool:
+        return self.errorcode == "0"
+
+
+@dataclass(slots=True)
+class PurchaseResult:
+    errorcode: str | None
+    tokens: list[str]
+    recharge_amount: str | None
+    recharge_volume: str | None
+    fields: dict[str, str]
+
+    @property
+    def ok(self) -> bool:
+        return self.errorcode == "0"
+
+
+class LapisClient:
+    def __init__(self, pool: EndpointPool, connection: str):
+        self.pool = pool
+        self.headers = {"Connection": connection}
+
+    async def query_customer(self, query: CustomerQuery) -> CustomerResult:
+        # Picked per call, so a hedged copy can land on a different endpoint
+        endpoint = self.pool.pick()
+        res = await self.pool.request(
+            endpoint,
+            "querycustomerbymeternumber",
+            "GET",
+            params=query.params(endpoint.platform_id),
+            headers=self.headers,
+        )
+        fields = decode_response(res.text)
+        errorcode = fields.get("errorcode")
+        lapis_error_codes_total.inc("querycustomerbymeternumber", errorcode)
+        return CustomerResult(errorcode, fields.get("customername"), fields)
+
+    async def purchase(self, request: PurchaseRequest) -> PurchaseResult:
+        # Retries for a meter must reach the backend that saw the first attempt
+        endpoint = self.pool.pick_sticky(request.meter_number)
+        res = await self.pool.request(
+            endpoint,
+            "purchasebytransid",
+            "POST",
+            data=request.form(endpoint.platform_id),
+            headers=self.headers,
+        )
+        fields = decode_response(res.text)
+        errorcode = fields.get("errorcode")
+        lapis_error_codes_total.inc("purchasebytransid", errorcode)
+        return PurchaseResult(
+            errorcode,
+            parse_tokens(fields.get("tokenlist")),
+            fields.get("rechargeamount"),
+            fields.get("rechargevolume"),
+            fields,
+        )
+
+
+lapis = LapisClient(laison_pool, settings.connection)
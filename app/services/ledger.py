@@ -0,0 +1,94 @@
+import asyncio
+import json
+import threading
+import time
+import weakref
+
+from cachetools import LRUCache
+
+from core.config import settings
+from services.database import Database
+
+RECEIVED = "received"
+TOKEN_ISSUED = "token_issued"
+SMS_SENT = "sms_sent"
+CONFIRMED = "confirmed"
+
+
+def order_state(order: dict) -> str:
+    if order.get("sms_sent") and order.get("confirmed"):
+        return CONFIRMED
+    if order.get("sms_sent"):
+        return SMS_SENT
+    if order.get("token_status") is not None:
+        return TOKEN_ISSUED
+    return RECEIVED
+
+
+class OrderLedger:
+    """Persistent record of every order's fulfilment state and result.
+
+    Recent entries are mirrored in memory so that a redelivered webhook is
+    answered without touching SQLite, LAPIS or Hubtel.
+    """
+
+    def __init__(self, path: str, cache_size: int):
+        self._recent = LRUCache(maxsize=cache_size)
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self._db_lock = threading.Lock()
+        self._db = Database(
+            path,
+            schema=(
+                """
+                CREATE TABLE IF NOT EXISTS orders (
+                    order_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """,
+            ),
+        )
+
+    def lock(self, order_id: str) -> asyncio.Lock:
+        """Lock that serializes concurrent deliveries of the same order."""
+        lock = self._locks.get(order_id)
+        if lock is None:
+            lock = self._locks[order_id] = asyncio.Lock()
+        return lock
+
+    def _get(self, order_id: str) -> dict | None:
+        with self._db_lock:
+            row = self._db.conn.execute(
+                "SELECT result FROM orders WHERE order_id = ?", (order_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _put(self, order_id: str, state: str, result: str):
+        with self._db_lock:
+            self._db.conn.execute(
+                "INSERT INTO orders (order_id, state, result, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (order_id) DO UPDATE SET state = excluded.state, "
+                "result = excluded.result, updated_at = excluded.updated_at",
+                (order_id, state, result, time.time()),
+            )
+
+    async def get(self, order_id: str) -> dict | None:
+        order = self._recent.get(order_id)
+        if order is None:
+            order = await asyncio.to_thread(self._get, order_id)
+            if order is not None:
+                self._recent[order_id] = order
+        return order
+
+    async def record(self, order: dict):
+        order = {**order, "state": order_state(order)}
+        self._recent[order["order_id"]] = order
+        await asyncio.to_thread(
+            self._put, order["order_id"], order["state"], json.dumps(order)
+        )
+
+
+ledger = OrderLedger(settings.fulfilment_db, cache_size=settings.ledger_cache_size)
@@ -0,0 +1,220 @@
+import time
+
+from fastapi import HTTPException
+from loguru import logger
+
+from core.config import settings
+from core.fast_json import CallbackRequest
+from core.flow import Flow, InvalidInput, Reply, Step, parse_amount
+from core.messages import SCREENS
+from core.metrics import sequence_label, ussd_hop_seconds
+from core.schema import HubtelRequest
+from core.tracing import traced
+from services.cache import AsyncTTLCache
+from services.client_state import decode_client_state, encode_client_state
+from services.history import LastPurchase, purchase_history
+from services.laison import format_customer_prompt, get_customer_name
+from services.meter_filter import check_meter_number
+from services.resilience import ServiceBusy
+from services.session import sessions
+from services.vault import NOT_FOUND, SENT, resend_token
+
+CUSTOMER_CARE_NUMBER = settings.customer_care
+SESSION_EXPIRED = "Your session has expired. Please start again"
+SERVICE_BUSY = "The service is busy at the moment. Please try again in a few minutes"
+REPEAT_CHOICE = "1"
+RESEND_CHOICE = "0"
+RESEND_HINT = f"\n\n{RESEND_CHOICE}. Resend my last token"
+RESEND_MESSAGES = {
+    SENT: "Your last token is on its way to you by SMS",
+    NOT_FOUND: f"We could not find a recent token for this number. Please contact customer care at {CUSTOMER_CARE_NUMBER}",
+}
+TOO_SOON_MESSAGE = "Your token was sent recently. Please wait a few minutes before asking again"
+
+
+def format_repeat_prompt(last: LastPurchase) -> str:
+    return (
+        "Welcome back to NUMA!\n\n"
+        f"{REPEAT_CHOICE}. Top up {last.meter_number} {last.customer_name.upper()} "
+        f"again with GHC{last.amount:.2f}\n\n"
+        "Or enter a meter number" + (RESEND_HINT if settings.token_vault else "")
+    )
+
+
+async def welcome(request: HubtelRequest, state: dict) -> Reply:
+    if settings.purchase_history_size > 0 and request.Mobile:
+        try:
+            last = await purchase_history.get(request.Mobile)
+        except Exception as e:
+            logger.warning("Purchase history unavailable", error=str(e))
+            last = None
+        if last is not None:
+            return Reply(
+                SCREENS["repeat"],
+                message=format_repeat_prompt(last),
+                state={
+                    "repeat": {
+                        "meter_number": last.meter_number,
+                        "customer_name": last.customer_name,
+                        "amount": last.amount,
+                    }
+                },
+                next_step="repeat",
+            )
+    return Reply(
+        SCREENS["welcome"],
+        message=SCREENS["welcome"].Message + RESEND_HINT if settings.token_vault else None,
+        next_step="meter",
+    )
+
+
+async def resend_last_token(request: HubtelRequest) -> Reply:
+    # Straight from the vault, without LAPIS
+    outcome = await resend_token(mobile=request.Mobile, session_id=request.SessionId)
+    return Reply(SCREENS["release"], message=RESEND_MESSAGES.get(outcome, TOO_SOON_MESSAGE))
+
+
+async def choose_repeat(request: HubtelRequest, state: dict) -> Reply:
+    if request.Message.strip() != REPEAT_CHOICE:
+        return await enter_meter(request, state)
+
+    # The stored name stands in for the customer lookup
+    last = state["repeat"]
+    amount = parse_amount(str(last["amount"]), settings.min_top_up, settings.max_top_up)
+    logger.info("Repeating last top up", session_id=request.SessionId, sampled=True)
+    return Reply(
+        SCREENS["cart"],
+        price=float(amount),
+        state={
+            "meter_number": last["meter_number"],
+            "customer_name": last["customer_name"],
+            "mobile": request.Mobile,
+        },
+    )
+
+
+async def enter_meter(request: HubtelRequest, state: dict) -> Reply:
+    if settings.token_vault and request.Message.strip() == RESEND_CHOICE:
+        return await resend_last_token(request)
+    # Typos and unknown meters are rejected here instead of costing a LAPIS call
+    meter_number = check_meter_number(request.Message)
+    customer_name = await get_customer_name(meter_number)
+    logger.info("Customer data retrieved", session_id=request.SessionId, sampled=True)
+    return Reply(
+        SCREENS["amount"],
+        message=format_customer_prompt(meter_number, customer_name),
+        state={
+            "meter_number": meter_number,
+            "customer_name": customer_name,
+            "mobile": request.Mobile,
+        },
+        next_step="amount",
+    )
+
+
+async def enter_amount(request: HubtelRequest, state: dict) -> Reply:
+    amount = parse_amount(request.Message, settings.min_top_up, settings.max_top_up)
+    logger.info("Price updated", session_id=request.SessionId, amount=amount, sampled=True)
+    return Reply(SCREENS["cart"], price=float(amount), state=state)
+
+
+flow = Flow(
+    start="welcome",
+    steps=[
+        Step("welcome", welcome),
+        Step("repeat", choose_repeat),
+        Step("meter", enter_meter),
+        Step("amount", enter_amount),
+    ],
+)
+
+
+async def load_state(request: HubtelRequest) -> dict | None:
+    if request.Sequence == 1:
+        return {}
+    if settings.stateless_sessions:
+        return decode_client_state(request.SessionId, request.ClientState)
+    return await sessions.get(request.SessionId)
+
+
+async def save_state(request: HubtelRequest, reply: Reply) -> str | None:
+    """Persist state for the next hop, returning the ClientState token if any."""
+    state = {**reply.state, "step": reply.next_step}
+    if settings.stateless_sessions:
+        if reply.next_step is None:
+            # The payment webhook does not echo ClientState, so hand the
+            # meter and the dialling Mobile over to /payment through the
+            # session store
+            await sessions.set(request.SessionId, {"mobile": request.Mobile, **reply.state})
+            return None
+        return encode_client_state(request.SessionId, state)
+
+    await sessions.set(request.SessionId, state)
+    return None
+
+
+callback_memo = AsyncTTLCache(
+    maxsize=settings.callback_memo_maxsize, ttl=max(settings.callback_memo_ttl, 1)
+)
+
+
+def release(session_id: str, message: str) -> dict:
+    return SCREENS["release"].render(session_id, message=message)
+
+
+@traced("ussd.callback", trace_key="request.SessionId", attributes=("request.Sequence",))
+async def handle_callback(request: HubtelRequest | CallbackRequest) -> dict:
+    if settings.callback_memo_ttl <= 0:
+        return await process_callback(request)
+
+    # A retransmitted hop gets the stored response, or waits for the original
+    # if it is still being processed, instead of running the step again
+    return await callback_memo.get_or_load(
+        (request.SessionId, request.Sequence, request.Message),
+        lambda: process_callback(request),
+    )
+
+
+async def process_callback(request: HubtelRequest | CallbackRequest) -> dict:
+    log = logger.bind(session_id=request.SessionId, sequence=request.Sequence)
+    log.info("Processing callback", sampled=True)
+    start = time.monotonic()
+    try:
+        state = await load_state(request)
+        step = flow.step_for(request, state)
+        if step is None:
+            return release(request.SessionId, SESSION_EXPIRED)
+
+        reply = await step.handle(request, state)
+        client_state = await save_state(request, reply)
+        return reply.screen.render(
+            request.SessionId,
+            message=reply.message,
+            price=reply.price,
+            client_state=client_state,
+        )
+
+    except InvalidInput as e:
+        log.info("Invalid input", error=str(e))
+        return release(request.SessionId, str(e))
+
+    except ServiceBusy as e:
+        log.warning("Releasing session early", error=e.detail)
+        return release(request.SessionId, SERVICE_BUSY)
+
+    except HTTPException as e:
+        log.error("HTTP error while processing request", error=e.detail)
+        return release(
+            request.SessionId,
+            f"An error occurred while processing your request. \nDetails: {e.detail}",
+        )
+
+    except Exception as e:
+        log.error("Unexpected error while processing request", error=str(e))
+        return release(
+            request.SessionId,
+            f"An unexpected error occurred. Please contact customer care at {CUSTOMER_CARE_NUMBER} for assistance",
+        )
+
+    finally:
+        ussd_hop_seconds.observe(time.monotonic() - start, sequence_label(request.Sequence))
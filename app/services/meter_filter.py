@@ -0,0 +1,155 @@
+import asyncio
+import math
+import os
+from hashlib import blake2b
+
+from loguru import logger
+
+from core.config import settings
+from core.flow import InvalidInput, parse_meter_number
+
+UNKNOWN_METER = "Meter number not recognised. Please check the number on your meter and try again"
+
+
+class BloomFilter:
+    """Fixed-size set membership with false positives but no false negatives."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from one 128-bit digest
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @classmethod
+    def build(cls, items: list[str], error_rate: float) -> "BloomFilter":
+        bloom = cls(len(items), error_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+
+def read_meter_export(path: str) -> list[str]:
+    """Meter numbers from a one-per-line or CSV export; other lines are skipped."""
+    meters = []
+    with open(path) as f:
+        for line in f:
+            meter = line.split(",", 1)[0].strip().strip('"')
+            if meter.isdigit():
+                meters.append(meter)
+    return meters
+
+
+class KnownMeterFilter:
+    """Rejects meters missing from the latest export without asking LAPIS.
+
+    Without an export every meter is let through.
+    """
+
+    def __init__(self, path: str, error_rate: float):
+        self.path = path
+        self.error_rate = error_rate
+        self._bloom: BloomFilter | None = None
+        self._mtime: float | None = None
+        self._task: asyncio.Task | None = None
+        self.checked = 0
+        self.rejected = 0
+
+    def might_exist(self, meter_number: str) -> bool:
+        if self._bloom is None:
+            return True
+        self.checked += 1
+        if meter_number in self._bloom:
+            return True
+        self.rejected += 1
+        return False
+
+    def _load(self) -> BloomFilter:
+        return BloomFilter.build(read_meter_export(self.path), self.error_rate)
+
+    async def refresh(self):
+        """Rebuild the filter off the event loop if the export has changed."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            logger.warning("Known meter export unavailable", path=self.path, error=str(e))
+            return
+        if mtime == self._mtime:
+            return
+
+        bloom = await asyncio.to_thread(self._load)
+        if bloom.count == 0:
+            # An empty export would reject every meter
+            logger.warning("Known meter export is empty, keeping previous filter", path=self.path)
+            return
+        # Swapped in one assignment, so lookups never see a partial filter
+        self._bloom, self._mtime = bloom, mtime
+        logger.info("Known meter filter loaded", meters=bloom.count, bits=bloom.size)
+
+    async def start(self, interval: float):
+        if not self.path:
+            return
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error("Failed to load known meter filter", error=str(e))
+        if interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Failed to refresh known meter filter", error=str(e))
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self._bloom is not None,
+            "meters": self._bloom.count if self._bloom is not None else 0,
+            "bits": self._bloom.size if self._bloom is not None else 0,
+            "checked": self.checked,
+            "rejected": self.rejected,
+        }
+
+
+known_meters = KnownMeterFilter(settings.known_meters_file, settings.known_meters_error_rate)
+
+
+def check_meter_number(text: str) -> str:
+    """Validate format, check digit and membership before any LAPIS call."""
+    meter_number = parse_meter_number(
+        text,
+        settings.meter_min_length,
+        settings.meter_max_length,
+        settings.meter_check_digit,
+    )
+    if not known_meters.might_exist(meter_number):
+        raise InvalidInput(UNKNOWN_METER)
+    return meter_number
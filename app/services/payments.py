@@ -0,0 +1,100 @@
+from fastapi import HTTPException
+from loguru import logger
+
+from core.config import settings
+from core.tracing import traced
+from services.fulfilment import build_order, fulfil_order, fulfilment_worker
+from services.history import LastPurchase, purchase_history
+from services.ledger import CONFIRMED, ledger
+from services.session import sessions
+
+
+def payment_outcome(order: dict) -> dict:
+    if order["state"] == CONFIRMED:
+        return {"messages": "Payment processed succesfully", "state": order["state"]}
+    return {"messages": "Payment received", "state": order["state"]}
+
+
+async def remember_purchase(session: dict, order: dict):
+    """Offer this purchase as the repeat top-up on the customer's next session."""
+    if settings.purchase_history_size <= 0 or not session.get("customer_name"):
+        return
+    try:
+        await purchase_history.record(
+            session.get("mobile") or order["customer_number"],
+            LastPurchase(order["meter_number"], session["customer_name"], order["amount"]),
+        )
+    except Exception as e:
+        logger.warning(
+            "Failed to record purchase history", order_id=order["order_id"], error=str(e)
+        )
+
+
+@traced("ussd.payment", trace_key="session_id", attributes=("order_id",))
+async def handle_payment(
+    session_id: str,
+    order_id: str,
+    is_successful: bool,
+    amount: float,
+    customer_number: str,
+) -> dict:
+    log = logger.bind(session_id=session_id, order_id=order_id)
+    log.info("Processing payment", successful=is_successful)
+
+    if is_successful:
+        try:
+            async with ledger.lock(order_id):
+                order = await ledger.get(order_id)
+                if order is not None and (
+                    order["state"] == CONFIRMED or settings.fulfilment_mode == "queue"
+                ):
+                    log.info("Duplicate delivery", state=order["state"])
+                    return payment_outcome(order)
+
+                if order is None:
+                    session = await sessions.get(session_id)
+                    if session is None:
+                        raise HTTPException(
+                            status_code=404,
+                            detail=f"No meter number found for SessionId {session_id}",
+                        )
+
+                    order = build_order(
+                        session_id=session_id,
+                        order_id=order_id,
+                        meter_number=session["meter_number"],
+                        amount=amount,
+                        customer_number=customer_number,
+                        mobile=session.get("mobile"),
+                    )
+                    await remember_purchase(session, order)
+
+                # Recorded before a worker can see the job, so that a worker's
+                # progress is never overwritten by this first record
+                await ledger.record(order)
+                if settings.fulfilment_mode == "queue":
+                    # Persist the order and let the background workers fulfil it
+                    await fulfilment_worker.submit(order)
+                    return {"messages": "Payment received"}
+
+                await fulfil_order(order)
+
+            return {"messages": "Payment processed succesfully"}
+
+        except HTTPException as e:
+            log.error("HTTP error during payment processing", error=e.detail)
+            raise HTTPException(
+                status_code=500,
+                detail=f"HTTP error during payment processing for OrderId {order_id}: {e.detail}",
+            )
+
+        except Exception as e:
+            log.error("Unexpected error during payment processing", error=str(e))
+            raise HTTPException(
+                status_code=500,
+                detail=f"Unexpected error during payment processing for OrderId {order_id}: {str(e)}",
+            )
+
+    else:
+        log.warning("Payment unsuccessful")
+        return {"Message": "Payment was not successful."}
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import threading
+import time
+
+from services.database import Database
+
+
+class JobQueue:
+    """Durable job queue in a local SQLite database running in WAL mode.
+
+    Claimed jobs hold a lease; a job whose worker died is handed out again
+    once its lease runs out.
+    """
+
+    def __init__(self, path: str, lease: float = 300.0):
+        self._lease = lease
+        self._lock = threading.Lock()
+        self._db = Database(
+            path,
+            schema=(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    order_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    locked_until REAL NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """,
+                "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, next_attempt_at)",
+            ),
+        )
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._db.conn.execute(sql, params)
+
+    def _enqueue(self, order_id: str, payload: dict) -> bool:
+        now = time.time()
+        cursor = self._execute(
+            "INSERT OR IGNORE INTO jobs (order_id, payload, next_attempt_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (order_id, json.dumps(payload), now, now, now),
+        )
+        return cursor.rowcount == 1
+
+    def _claim(self) -> tuple[str, dict, int] | None:
+        now = time.time()
+        with self._lock:
+            self._db.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.conn.execute(
+                    "SELECT order_id, payload, attempts FROM jobs "
+                    "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                    "OR (status = 'running' AND locked_until < ?) "
+                    "ORDER BY next_attempt_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is not None:
+                    self._db.conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                        "locked_until = ?, updated_at = ? WHERE order_id = ?",
+                        (now + self._lease, now, row[0]),
+                    )
+                self._db.conn.execute("COMMIT")
+            except Exception:
+                self._db.conn.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), row[2] + 1
+
+    def _save(self, order_id: str, payload: dict):
+        self._execute(
+            "UPDATE jobs SET payload = ?, updated_at = ? WHERE order_id = ?",
+            (json.dumps(payload), time.time(), order_id),
+        )
+
+    def _finish(self, order_id: str, status: str, error: str | None = None, delay: float = 0):
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, last_error = ?, next_attempt_at = ?, "
+            "locked_until = 0, updated_at = ? WHERE order_id = ?",
+            (status, error, now + delay, now, order_id),
+        )
+
+    def _status(self, order_id: str) -> str | None:
+        row = self._execute("SELECT status FROM jobs WHERE order_id = ?", (order_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _counts(self) -> dict:
+        rows = self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    async def enqueue(self, order_id: str, payload: dict) -> bool:
+        """Add a job, returning False if one already exists for the order."""
+        return await asyncio.to_thread(self._enqueue, order_id, payload)
+
+    async def claim(self) -> tuple[str, dict, int] | None:
+        """Lease the next due job as (order_id, payload, attempt)."""
+        return await asyncio.to_thread(self._claim)
+
+    async def save(self, order_id: str, payload: dict):
+        await asyncio.to_thread(self._save, order_id, payload)
+
+    async def complete(self, order_id: str):
+        await asyncio.to_thread(self._finish, order_id, "done")
+
+    async def retry(self, order_id: str, error: str, delay: float):
+        await asyncio.to_thread(self._finish, order_id, "pending", error, delay)
+
+    async def fail(self, order_id: str, error: str):
+        await asyncio.to_thread(self._finish, order_id, "failed", error)
+
+    async def status(self, order_id: str) -> str | None:
+        return await asyncio.to_thread(self._status, order_id)
+
+    async def counts(self) -> dict:
+        return await asyncio.to_thread(self._counts)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
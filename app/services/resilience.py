@@ -0,0 +1,229 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException
+from httpx import Response, TimeoutException, TransportError
+from loguru import logger
+
+from core.config import settings
+from core.metrics import upstream_request_seconds, upstream_responses_total
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ServiceBusy(HTTPException):
+    """Raised without calling the upstream when it is unhealthy or saturated."""
+
+    def __init__(self, upstream: str):
+        super().__init__(status_code=503, detail=f"{upstream} is busy")
+
+
+class DeadlineExceeded(TimeoutException):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one probe through once the
+    reset timeout has passed."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = HALF_OPEN
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def abandon(self):
+        self._probing = False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: grows while latency stays under target and is
+    cut back when it does not or a call fails."""
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.inflight = 0
+
+    def try_acquire(self) -> bool:
+        if self.inflight >= int(self.limit):
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self, latency: float, ok: bool):
+        self.inflight -= 1
+        if ok and latency <= self.latency_target:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        else:
+            self.limit = max(self.minimum, self.limit * 0.7)
+
+
+class Upstream:
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.breaker_failure_threshold,
+            reset_timeout=settings.breaker_reset_timeout,
+        )
+        # Calls made inside a USSD hop and those made off it each have their
+        # own limit, so a backlog of retried purchases cannot take every slot
+        # and turn the next customer lookup into a busy reply
+        self.limiter = self._limiter()
+        self.background_limiter = self._limiter()
+        self.rejected = 0
+
+    @staticmethod
+    def _limiter() -> AdaptiveLimiter:
+        return AdaptiveLimiter(
+            initial=settings.limiter_initial,
+            minimum=settings.limiter_min,
+            maximum=settings.limiter_max,
+            latency_target=settings.limiter_latency_target,
+        )
+
+    @property
+    def inflight(self) -> int:
+        return self.limiter.inflight + self.background_limiter.inflight
+
+    async def call(
+        self,
+        send: Callable[[], Awaitable[Response]],
+        deadline: float,
+        background: bool = False,
+    ) -> Response:
+        limiter = self.background_limiter if background else self.limiter
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise ServiceBusy(self.name)
+        if not limiter.try_acquire():
+            # Give back a half-open probe slot, or the breaker stays half
+            # open with no probe in flight and refuses every later call
+            self.breaker.abandon()
+            self.rejected += 1
+            raise ServiceBusy(self.name)
+
+        start = time.monotonic()
+        try:
+            res = await asyncio.wait_for(send(), timeout=deadline)
+        except asyncio.TimeoutError:
+            self._finish(limiter, start, ok=False)
+            raise DeadlineExceeded(f"{self.name} did not answer within {deadline:.1f}s")
+        except TransportError:
+            self._finish(limiter, start, ok=False)
+            raise
+        except BaseException:
+            # Cancelled or failed before reaching the upstream; not its fault
+            limiter.inflight -= 1
+            self.breaker.abandon()
+            raise
+
+        self._finish(limiter, start, ok=res.status_code < 500)
+        return res
+
+    def _finish(self, limiter: AdaptiveLimiter, start: float, ok: bool):
+        limiter.release(time.monotonic() - start, ok)
+        if ok:
+            self.breaker.record_success()
+            return
+
+        previous = self.breaker.state
+        self.breaker.record_failure()
+        if previous != OPEN and self.breaker.state == OPEN:
+            logger.warning("Circuit breaker opened", upstream=self.name)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "concurrency_limit": int(self.limiter.limit),
+            "inflight": self.limiter.inflight,
+            "background_concurrency_limit": int(self.background_limiter.limit),
+            "background_inflight": self.background_limiter.inflight,
+            "rejected": self.rejected,
+        }
+
+
+upstreams: dict[str, Upstream] = {}
+
+def get_upstream(name: str) -> Upstream:
+    upstream = upstreams.get(name)
+    if upstream is None:
+        upstream = upstreams[name] = Upstream(name)
+    return upstream
+
+
+# Customer lookups sit inside a USSD hop; everything else runs off the hop
+IN_HOP = {"querycustomerbymeternumber"}
+DEADLINES = {
+    "querycustomerbymeternumber": lambda: settings.ussd_hop_budget
+    - settings.ussd_hop_margin,
+    "purchasebytransid": lambda: settings.laison_timeout,
+    "sms": lambda: settings.hubtel_timeout,
+    "confirmation": lambda: settings.hubtel_timeout,
+}
+
+
+async def guarded(
+    upstream: str, operation: str, send: Callable[[], Awaitable[Response]]
+) -> Response:
+    """Send a request through the upstream's breaker and concurrency limiter."""
+    start = time.monotonic()
+    code = "error"
+    try:
+        res = await get_upstream(upstream).call(
+            send, deadline=DEADLINES[operation](), background=operation not in IN_HOP
+        )
+        code = str(res.status_code)
+        return res
+    except ServiceBusy:
+        code = "busy"
+        raise
+    except TimeoutException:
+        code = "timeout"
+        raise
+    except TransportError:
+        code = "transport_error"
+        raise
+    except asyncio.CancelledError:
+        code = "cancelled"
+        raise
+    finally:
+        if code != "busy":
+            upstream_request_seconds.observe(time.monotonic() - start, upstream, operation)
+        upstream_responses_total.inc(upstream, operation, code)
+
+
+def upstream_stats() -> dict:
+    return {name: upstream.stats() for name, upstream in upstreams.items()}
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import time
+
+from httpx import Response
+from loguru import logger
+
+from core.config import DEFAULT_PLATFORM_ID, LaisonEndpoint, settings
+from core.tracing import span
+from services.clients import get_client
+from services.resilience import OPEN, get_upstream, guarded
+
+EWMA_DECAY = 0.3
+
+
+class Endpoint:
+    def __init__(self, index: int, config: LaisonEndpoint):
+        self.name = f"laison:{index}"
+        self.url = config.url
+        self.platform_id = config.platform_id
+        self.outstanding = 0
+        self.ewma = 0.0
+        self.ejected_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        breaker = get_upstream(self.name).breaker
+        if breaker.state == OPEN and time.monotonic() - breaker.opened_at < breaker.reset_timeout:
+            return False
+        return time.monotonic() >= self.ejected_until
+
+    def observe(self, latency: float):
+        self.ewma = latency if not self.ewma else EWMA_DECAY * latency + (1 - EWMA_DECAY) * self.ewma
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "platform_id": self.platform_id,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "ewma_latency": round(self.ewma, 4),
+        }
+
+
+class EndpointPool:
+    """Balances LAPIS traffic across gateways and ejects unhealthy ones."""
+
+    def __init__(self, configs: list[LaisonEndpoint], balancing: str):
+        self.endpoints = [Endpoint(index, config) for index, config in enumerate(configs)]
+        self.balancing = balancing
+        self._health_task: asyncio.Task | None = None
+
+    @property
+    def client_names(self) -> list[str]:
+        return [endpoint.name for endpoint in self.endpoints]
+
+    def _candidates(self) -> list[Endpoint]:
+        # With every endpoint ejected, still try them rather than fail outright
+        return [endpoint for endpoint in self.endpoints if endpoint.healthy] or self.endpoints
+
+    def pick(self) -> Endpoint:
+        candidates = self._candidates()
+        if self.balancing == "ewma":
+            # Penalise queued work so a fast endpoint is not flooded
+            return min(candidates, key=lambda e: e.ewma * (e.outstanding + 1))
+        return min(candidates, key=lambda e: (e.outstanding, e.ewma))
+
+    def pick_sticky(self, key: str) -> Endpoint:
+        """Rendezvous-hash ``key`` so that it keeps landing on the same endpoint."""
+        candidates = self._candidates()
+        return max(
+            candidates,
+            key=lambda e: hashlib.blake2b(f"{e.name}:{key}".encode(), digest_size=8).digest(),
+        )
+
+    async def request(
+        self, endpoint: Endpoint, operation: str, method: str, **kwargs
+    ) -> Response:
+        endpoint.outstanding += 1
+        start = time.monotonic()
+        try:
+            with span(f"lapis.{operation}", endpoint=endpoint.name):
+                res = await guarded(
+                    endpoint.name,
+                    operation,
+                    lambda: get_client(endpoint.name).request(method, endpoint.url, **kwargs),
+                )
+        except Exception:
+            # A failure that returned quickly must not make the endpoint look fast
+            endpoint.observe(settings.laison_timeout)
+            raise
+        finally:
+            endpoint.outstanding -= 1
+        endpoint.observe(time.monotonic() - start)
+        return res
+
+    async def _check(self, endpoint: Endpoint):
+        try:
+            res = await asyncio.wait_for(
+                get_client(endpoint.name).get(endpoint.url), settings.laison_timeout
+            )
+            healthy = res.status_code < 500
+        except Exception:
+            healthy = False
+
+        if not healthy:
+            if endpoint.ejected_until <= time.monotonic():
+                logger.warning("Ejecting LAPIS endpoint", endpoint=endpoint.url)
+            endpoint.ejected_until = time.monotonic() + settings.laison_eject_for
+        else:
+            endpoint.ejected_until = 0.0
+
+    async def check_all(self):
+        """Probe every endpoint, which also opens a pooled connection to each."""
+        await asyncio.gather(*(self._check(endpoint) for endpoint in self.endpoints))
+
+    async def _health_loop(self, interval: float):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(interval)
+
+    def start_health_checks(self, interval: float):
+        if interval > 0 and len(self.endpoints) > 1:
+            self._health_task = asyncio.create_task(self._health_loop(interval))
+
+    async def stop_health_checks(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+
+    def stats(self) -> dict:
+        return {endpoint.name: endpoint.stats() for endpoint in self.endpoints}
+
+
+laison_pool = EndpointPool(
+    settings.laison_endpoints
+    or [LaisonEndpoint(url=settings.laison_url, platform_id=DEFAULT_PLATFORM_ID)],
+    balancing=settings.laison_balancing,
+)
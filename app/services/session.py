@@ -0,0 +1,118 @@
+import json
+import threading
+from abc import ABC, abstractmethod
+
+from loguru import logger
+
+from core.config import settings
+from services.cache import CountingTTLCache
+
+
+class SessionStore(ABC):
+    """Per-session USSD state shared between the callback and payment hops."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    async def get(self, session_id: str) -> dict | None: ...
+
+    @abstractmethod
+    async def set(self, session_id: str, data: dict): ...
+
+    @abstractmethod
+    async def delete(self, session_id: str): ...
+
+    async def close(self):
+        pass
+
+    def _record(self, data):
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": 0}
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store split into independently locked TTL shards."""
+
+    def __init__(self, maxsize: int, ttl: int, shards: int):
+        super().__init__()
+        shard_size = max(1, maxsize // shards)
+        self._shards = [CountingTTLCache(shard_size, ttl) for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def _shard(self, session_id: str) -> int:
+        return hash(session_id) % len(self._shards)
+
+    async def get(self, session_id: str) -> dict | None:
+        index = self._shard(session_id)
+        with self._locks[index]:
+            return self._record(self._shards[index].get(session_id))
+
+    async def set(self, session_id: str, data: dict):
+        index = self._shard(session_id)
+        with self._locks[index]:
+            self._shards[index][session_id] = data
+
+    async def delete(self, session_id: str):
+        index = self._shard(session_id)
+        with self._locks[index]:
+            self._shards[index].pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "evictions": sum(shard.evictions for shard in self._shards),
+            "size": sum(len(shard) for shard in self._shards),
+        }
+
+
+class RedisSessionStore(SessionStore):
+    """Store backed by any server speaking the Redis protocol."""
+
+    def __init__(self, url: str, ttl: int, prefix: str = "ussd:session:"):
+        super().__init__()
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError(
+                "The 'redis' package is required for the redis session backend"
+            ) from e
+
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._ttl = ttl
+        self._prefix = prefix
+
+    async def get(self, session_id: str) -> dict | None:
+        raw = await self._redis.get(self._prefix + session_id)
+        return self._record(json.loads(raw) if raw is not None else None)
+
+    async def set(self, session_id: str, data: dict):
+        await self._redis.set(self._prefix + session_id, json.dumps(data), ex=self._ttl)
+
+    async def delete(self, session_id: str):
+        await self._redis.delete(self._prefix + session_id)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+def create_session_store() -> SessionStore:
+    if settings.session_backend == "redis":
+        logger.info("Using redis session store")
+        return RedisSessionStore(url=settings.redis_url, ttl=settings.session_ttl)
+
+    return MemorySessionStore(
+        maxsize=settings.session_maxsize,
+        ttl=settings.session_ttl,
+        shards=settings.session_shards,
+    )
+
+
+sessions = create_session_store()
@@ -0,0 +1,191 @@
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException
+from loguru import logger
+
+from core.config import settings
+from services.hedging import LatencyWindow
+from services.hubtel import send_customer_sms, send_sms_batch
+
+# Lower values are sent first
+TOKEN = 0
+ERROR = 1
+NOTIFICATION = 2
+
+
+@dataclass
+class SmsMessage:
+    message: str
+    customer_number: str
+    session_id: str = ""
+    order_id: str = ""
+    meter_number: str = ""
+    attempts: int = 0
+    future: asyncio.Future | None = field(default=None, repr=False)
+
+
+class RateLimiter:
+    """Token bucket; acquire() waits for tokens, try_acquire() does not."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: int = 1):
+        tokens = min(tokens, self.burst)
+        while not self.try_acquire(tokens):
+            await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class SmsDispatcher:
+    """Bounded, prioritised SMS queue drained in rate-limited micro-batches."""
+
+    def __init__(self):
+        self._queue: asyncio.PriorityQueue | None = None
+        self._order = itertools.count()
+        self._limiter = RateLimiter(settings.sms_rate_per_second, settings.sms_burst)
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+        self.latencies = LatencyWindow()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self):
+        self._stopping = False
+        self._queue = asyncio.PriorityQueue(maxsize=settings.sms_queue_size)
+        self._tasks = [
+            asyncio.create_task(self._run()) for _ in range(settings.sms_senders)
+        ]
+
+    async def stop(self):
+        # See FulfilmentWorker.stop
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, sms: SmsMessage, priority: int = NOTIFICATION) -> asyncio.Future:
+        """Queue an SMS; the returned future resolves once it has been delivered."""
+        if self._queue is None:
+            self.start()
+        sms.future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((priority, next(self._order), sms))
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="SMS queue is full.")
+        return sms.future
+
+    async def send(self, sms: SmsMessage, priority: int = NOTIFICATION):
+        await self.submit(sms, priority)
+
+    async def _next_batch(self) -> list[tuple[int, int, SmsMessage]]:
+        batch = [await self._queue.get()]
+        size = settings.sms_batch_size if settings.hubtel_sms_batch else 1
+        deadline = time.monotonic() + settings.sms_batch_wait
+        while len(batch) < size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+        return batch
+
+    async def _deliver(self, messages: list[SmsMessage]):
+        if len(messages) > 1:
+            await send_sms_batch(
+                [{"To": sms.customer_number, "Content": sms.message} for sms in messages]
+            )
+            return
+
+        sms = messages[0]
+        await send_customer_sms(
+            message=sms.message,
+            customer_number=sms.customer_number,
+            session_id=sms.session_id,
+            order_id=sms.order_id,
+            meter_number=sms.meter_number,
+        )
+
+    async def _run(self):
+        while not self._stopping:
+            batch = await self._next_batch()
+            messages = [sms for _, _, sms in batch]
+            await self._limiter.acquire(len(messages))
+
+            start = time.monotonic()
+            try:
+                await self._deliver(messages)
+            except Exception as e:
+                self._retry_or_fail(batch, e)
+                continue
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            self.latencies.record(time.monotonic() - start)
+            self.sent += len(messages)
+            for sms in messages:
+                if not sms.future.done():
+                    sms.future.set_result(None)
+
+    def _retry_or_fail(self, batch, error: Exception):
+        for priority, _, sms in batch:
+            sms.attempts += 1
+            if sms.attempts >= settings.sms_max_attempts:
+                self.failed += 1
+                logger.error(
+                    "Giving up on SMS", order_id=sms.order_id, attempts=sms.attempts
+                )
+                if not sms.future.done():
+                    sms.future.set_exception(error)
+                continue
+
+            self.retried += 1
+            delay = settings.sms_retry_base * 2 ** (sms.attempts - 1)
+            asyncio.get_running_loop().call_later(delay, self._requeue, priority, sms)
+
+    def _requeue(self, priority: int, sms: SmsMessage):
+        try:
+            self._queue.put_nowait((priority, next(self._order), sms))
+        except asyncio.QueueFull:
+            if not sms.future.done():
+                sms.future.set_exception(
+                    HTTPException(status_code=503, detail="SMS queue is full.")
+                )
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "send_latency_p50": self.latencies.percentile(0.5) if len(self.latencies) else None,
+            "send_latency_p95": self.latencies.percentile(0.95) if len(self.latencies) else None,
+        }
+
+
+sms_dispatcher = SmsDispatcher()
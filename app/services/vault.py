@@ -0,0 +1,212 @@
+import asyncio
+import json
+import threading
+import time
+from hashlib import blake2b
+
+from cachetools import TTLCache
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+from loguru import logger
+
+from core.config import settings
+from core.flow import normalise_mobile
+from services.database import Database
+from services.lapis import format_tokens
+from services.sms import TOKEN, SmsMessage, sms_dispatcher
+
+NONCE_BYTES = 12
+TAG_BYTES = 16
+PURGE_INTERVAL = 3600.0
+
+SENT = "sent"
+NOT_FOUND = "not_found"
+TOO_SOON = "too_soon"
+
+
+def vault_master_key() -> bytes:
+    if settings.vault_key:
+        return bytes.fromhex(settings.vault_key)
+    return blake2b(settings.root_key.encode(), digest_size=32, person=b"numa-vault").digest()
+
+
+class TokenVault:
+    """Issued tokens, kept so they can be resent without LAPIS.
+
+    Token details are sealed with AES-GCM, bound to their transaction id.
+    The meter number and Mobile are only stored as keyed hashes, which is
+    enough to index them without revealing them.
+    """
+
+    def __init__(self, path: str, master_key: bytes, retention_days: float):
+        self._seal_key = blake2b(master_key, digest_size=32, person=b"vault-seal").digest()
+        self._index_key = blake2b(master_key, digest_size=32, person=b"vault-index").digest()
+        self.retention = retention_days * 86400
+        self._last_purge = 0.0
+        self._db_lock = threading.Lock()
+        self._db = Database(
+            path,
+            schema=(
+                """
+                CREATE TABLE IF NOT EXISTS tokens (
+                    transaction_id TEXT PRIMARY KEY,
+                    meter_key BLOB NOT NULL,
+                    mobile_key BLOB,
+                    sealed BLOB NOT NULL,
+                    issued_at REAL NOT NULL
+                )
+                """,
+                "CREATE INDEX IF NOT EXISTS tokens_meter ON tokens (meter_key, issued_at)",
+                "CREATE INDEX IF NOT EXISTS tokens_mobile ON tokens (mobile_key, issued_at)",
+                "CREATE INDEX IF NOT EXISTS tokens_issued ON tokens (issued_at)",
+            ),
+        )
+        self.stored = 0
+
+    def _index(self, value: str) -> bytes:
+        return blake2b(value.encode(), key=self._index_key, digest_size=16).digest()
+
+    def _seal(self, transaction_id: str, record: dict) -> bytes:
+        cipher = AES.new(self._seal_key, AES.MODE_GCM, nonce=get_random_bytes(NONCE_BYTES))
+        cipher.update(transaction_id.encode())
+        ciphertext, tag = cipher.encrypt_and_digest(json.dumps(record).encode())
+        return cipher.nonce + tag + ciphertext
+
+    def _unseal(self, transaction_id: str, sealed: bytes) -> dict:
+        nonce, tag = sealed[:NONCE_BYTES], sealed[NONCE_BYTES : NONCE_BYTES + TAG_BYTES]
+        cipher = AES.new(self._seal_key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(transaction_id.encode())
+        return json.loads(cipher.decrypt_and_verify(sealed[NONCE_BYTES + TAG_BYTES :], tag))
+
+    def _put(self, transaction_id: str, meter_number: str, mobile: str | None, sealed: bytes):
+        now = time.time()
+        with self._db_lock:
+            self._db.conn.execute(
+                "INSERT OR REPLACE INTO tokens "
+                "(transaction_id, meter_key, mobile_key, sealed, issued_at) VALUES (?, ?, ?, ?, ?)",
+                (
+                    transaction_id,
+                    self._index(meter_number),
+                    self._index(mobile) if mobile else None,
+                    sealed,
+                    now,
+                ),
+            )
+            if now - self._last_purge >= PURGE_INTERVAL:
+                self._last_purge = now
+                self._db.conn.execute(
+                    "DELETE FROM tokens WHERE issued_at < ?", (now - self.retention,)
+                )
+
+    def _latest(self, column: str, value: str) -> dict | None:
+        with self._db_lock:
+            row = self._db.conn.execute(
+                f"SELECT transaction_id, sealed, issued_at FROM tokens WHERE {column} = ? "
+                "AND issued_at >= ? ORDER BY issued_at DESC LIMIT 1",
+                (self._index(value), time.time() - self.retention),
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            record = self._unseal(row[0], row[1])
+        except ValueError:
+            # Sealed under another key, or tampered with
+            logger.warning("Failed to unseal token", transaction_id=row[0])
+            return None
+        return {**record, "transaction_id": row[0], "issued_at": row[2]}
+
+    async def store(
+        self,
+        transaction_id: str,
+        meter_number: str,
+        mobile: str | None,
+        tokens: list[str],
+        recharge_amount: str | None,
+        recharge_volume: str | None,
+    ):
+        mobile = normalise_mobile(mobile)
+        record = {
+            "meter_number": meter_number,
+            "mobile": mobile,
+            "tokens": tokens,
+            "recharge_amount": recharge_amount,
+            "recharge_volume": recharge_volume,
+        }
+        sealed = self._seal(transaction_id, record)
+        await asyncio.to_thread(self._put, transaction_id, meter_number, mobile, sealed)
+        self.stored += 1
+
+    async def latest(
+        self, mobile: str | None = None, meter_number: str | None = None
+    ) -> dict | None:
+        """The most recent token for a Mobile, or else for a meter, within retention."""
+        if mobile:
+            return await asyncio.to_thread(self._latest, "mobile_key", normalise_mobile(mobile))
+        if meter_number:
+            return await asyncio.to_thread(self._latest, "meter_key", meter_number)
+        return None
+
+
+token_vault = TokenVault(settings.fulfilment_db, vault_master_key(), settings.vault_retention_days)
+
+# Mobiles and meters that had a token resent recently
+_recent_resends = TTLCache(maxsize=100000, ttl=max(settings.vault_resend_interval, 1))
+resend_counts = {SENT: 0, NOT_FOUND: 0, TOO_SOON: 0}
+
+
+def format_resend(issued: dict) -> str:
+    return (
+        f"Your last NUMA token\n"
+        f"Transaction ID: {issued['transaction_id']}\n"
+        f"Meter: {issued['meter_number']}\n"
+        f"Recharge Volume: {issued['recharge_volume']} \n"
+        f"{format_tokens(issued['tokens'])}\n\n"
+        f"For more information, please contact: {settings.customer_care}"
+    )
+
+
+async def resend_token(
+    mobile: str | None = None,
+    meter_number: str | None = None,
+    session_id: str = "",
+    wait: bool = False,
+) -> str:
+    """Resend the latest stored token by SMS to the Mobile that bought it.
+
+    Returns SENT, NOT_FOUND or TOO_SOON. With ``wait`` the SMS has been
+    delivered when this returns; otherwise it is only queued.
+    """
+    mobile = normalise_mobile(mobile)
+    key = f"mobile:{mobile}" if mobile else f"meter:{meter_number}"
+    if key in _recent_resends:
+        resend_counts[TOO_SOON] += 1
+        return TOO_SOON
+
+    issued = await token_vault.latest(mobile=mobile, meter_number=meter_number)
+    if issued is None or not issued["mobile"]:
+        resend_counts[NOT_FOUND] += 1
+        return NOT_FOUND
+
+    _recent_resends[key] = True
+    future = sms_dispatcher.submit(
+        SmsMessage(
+            message=format_resend(issued),
+            customer_number=issued["mobile"],
+            session_id=session_id,
+            order_id=issued["transaction_id"],
+            meter_number=issued["meter_number"],
+        ),
+        priority=TOKEN,
+    )
+    resend_counts[SENT] += 1
+    logger.info("Resending token", transaction_id=issued["transaction_id"], session_id=session_id)
+    if wait:
+        await future
+    else:
+        # Failures are logged by the dispatcher; nothing else awaits this
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    return SENT
+
+
+def vault_stats() -> dict:
+    return {"stored": token_vault.stored, "resends": dict(resend_counts)}
@@ -0,0 +1,47 @@
+"""Standalone fulfilment worker.
+
+Run alongside the web process (with FULFILMENT_WORKERS=0 there) to drain the
+fulfilment queue in its own process:
+
+    python app/worker.py
+"""
+
+import asyncio
+import signal
+
+from loguru import logger
+
+from core.config import settings
+from core.logging import setup_logging
+from core.tracing import start_tracing, stop_tracing
+from services.clients import close_clients, start_clients
+from services.fulfilment import fulfilment_worker
+from services.routing import laison_pool
+from services.sms import sms_dispatcher
+
+
+async def main():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await start_clients(["hubtel", *laison_pool.client_names])
+    start_tracing()
+    sms_dispatcher.start()
+    fulfilment_worker.start(max(1, settings.fulfilment_workers))
+    logger.info("Fulfilment worker running")
+    await stop.wait()
+
+    await fulfilment_worker.stop()
+    await sms_dispatcher.stop()
+    # Flush spans recorded during shutdown before the pools close
+    await stop_tracing()
+    await close_clients()
+    fulfilment_worker.queue.close()
+    await logger.complete()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""Purchase-string throughput: original per-call path, cached root cipher, batched.
+
+    python benchmarks/bench_encryption.py
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from Crypto.Cipher import AES  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from services.encryption import PaymentEncryption  # noqa: E402
+
+# Known vector from services/encryption.py __main__
+ROOT_KEY = "DCC78B3DAC5CA7409A01F45D81106753"
+TRANSACTION_ID = "ac3307bcca7445618071e6b0e41b50b5"
+AMOUNT = 10
+EXPECTED = "5569B456D74D4CD463014C82CA4D87B2"
+
+BATCH = 1000
+
+
+def original(encryption: PaymentEncryption, transaction_id, payment):
+    """The pre-cache implementation: new ciphers and eager debug formatting per call."""
+    hexed = encryption.bytes_to_hex_string
+    transid_bytes = encryption.ascii_to_16_bytes(transaction_id)
+    logger.debug(f"Transaction ID: {hexed(transid_bytes)}")
+    encrypted_transaction = AES.new(encryption.m_rootkey, AES.MODE_ECB).encrypt(transid_bytes)
+    logger.debug(f"Encrypted transaction ID: {hexed(encrypted_transaction)}")
+    payment_bytes = encryption.ascii_to_16_bytes(f"{payment:.2f}")
+    logger.debug(f"Payment: {hexed(payment_bytes)}")
+    purchase_bytes = AES.new(encrypted_transaction, AES.MODE_ECB).encrypt(payment_bytes)
+    logger.debug(f"Encrypted purchase parameter: {hexed(purchase_bytes)}")
+    hex_str = hexed(purchase_bytes)
+    logger.debug(f"Purchase string: {hex_str}")
+    return hex_str
+
+
+def main():
+    # Production runs at INFO, so debug records are dropped
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+
+    encryption = PaymentEncryption(ROOT_KEY)
+    assert original(encryption, TRANSACTION_ID, AMOUNT) == EXPECTED
+    assert encryption.generate_purchase_string(TRANSACTION_ID, AMOUNT) == EXPECTED
+
+    # Only the first 16 characters reach the cipher, so that is where they differ
+    batch = [(f"{index:016d}{TRANSACTION_ID[16:]}", 10 + index % 500) for index in range(BATCH)]
+    assert encryption.generate_purchase_strings(batch) == [
+        original(encryption, *pair) for pair in batch
+    ]
+
+    def run(label, func):
+        seconds = min(timeit.repeat(func, number=1, repeat=7))
+        print(f"{label:24} {BATCH / seconds:10,.0f} strings/s  {seconds / BATCH * 1e6:6.2f} us/string")
+
+    run("original per-call", lambda: [original(encryption, *pair) for pair in batch])
+    run("cached per-call", lambda: [encryption.generate_purchase_string(*pair) for pair in batch])
+    run("batched", lambda: encryption.generate_purchase_strings(batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Per-request CPU of the validated and fast JSON paths for /callback and /payment.
+
+    python benchmarks/bench_json.py
+"""
+
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from core.fast_json import decode_callback, decode_payment, encode, msgspec  # noqa: E402
+from core.messages import SCREENS  # noqa: E402
+from core.schema import HubtelRequest, HubtelResponse, PayementRequest  # noqa: E402
+
+CALLBACK = json.dumps(
+    {
+        "Type": "Response",
+        "Message": "1234567890123",
+        "ServiceCode": "713",
+        "Operator": "mtn",
+        "ClientState": None,
+        "Mobile": "233200000000",
+        "SessionId": "3c796dac28174f739de4262d08409c51",
+        "Sequence": 2,
+        "Platform": "USSD",
+    }
+).encode()
+
+PAYMENT = json.dumps(
+    {
+        "SessionId": "3c796dac28174f739de4262d08409c51",
+        "OrderId": "ac3307bcca7445618071e6b0e41b50b5",
+        "ExtraData": {},
+        "OrderInfo": {
+            "CustomerMobileNumber": "233200000000",
+            "CustomerEmail": "customer@example.com",
+            "CustomerName": "John Doe",
+            "Status": "Paid",
+            "OrderDate": "2024-10-01T10:00:00.000Z",
+            "Currency": "GHS",
+            "BranchName": "Haatso",
+            "IsRecurring": False,
+            "RecurringInvoiceId": None,
+            "Subtotal": 20.3,
+            "Items": [
+                {"ItemId": "1", "Name": "Send Money", "Quantity": 1, "UnitPrice": 20.0}
+            ],
+            "Payment": {
+                "PaymentType": "mobilemoney",
+                "AmountPaid": 20.3,
+                "AmountAfterCharges": 20.0,
+                "PaymentDate": "2024-10-01T10:00:00.000Z",
+                "PaymentDescription": "The MTN Mobile Money payment has been approved",
+                "IsSuccessful": True,
+            },
+        },
+    }
+).encode()
+
+RESPONSE = SCREENS["amount"].render(
+    "3c796dac28174f739de4262d08409c51",
+    message="You have requested to top up 1234567890123 JOHN DOE. \n\nEnter top up amount:",
+)
+
+
+def validated_callback():
+    request = HubtelRequest.model_validate_json(CALLBACK)
+    # What response_model=HubtelResponse costs FastAPI on every hop
+    HubtelResponse.model_validate(RESPONSE).model_dump_json()
+    return request
+
+
+def fast_callback():
+    request = decode_callback(CALLBACK)
+    encode(RESPONSE)
+    return request
+
+
+def validated_payment():
+    return PayementRequest.model_validate_json(PAYMENT)
+
+
+def fast_payment():
+    return decode_payment(PAYMENT)
+
+
+def bench(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    number = 20000
+    print(f"decoder: {'msgspec' if msgspec is not None else 'stdlib json'}")
+    for name, slow, fast in (
+        ("/callback", validated_callback, fast_callback),
+        ("/payment", validated_payment, fast_payment),
+    ):
+        slow_us, fast_us = bench(slow, number), bench(fast, number)
+        print(
+            f"{name:10} validated {slow_us:7.2f} us  fast {fast_us:7.2f} us  "
+            f"saved {slow_us - fast_us:7.2f} us/request ({slow_us / fast_us:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
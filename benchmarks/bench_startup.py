@@ -0,0 +1,198 @@
+"""Cold start: how long until a fresh replica answers /ready, and what it costs.
+
+Compares a single uvicorn process, uvicorn's own --workers (each worker
+imports the app itself) and app/serve.py (one import, forked workers). For
+each it reports the time from launch to the first 200 on /ready, the CPU
+spent by the whole process tree and its total proportional set size, so
+that memory shared copy-on-write is only counted once.
+
+    python benchmarks/bench_startup.py --workers 4 --runs 5
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+APP = ROOT / "app"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def app_env() -> dict:
+    # Nothing is called at startup, so the upstreams need not exist. Several
+    # workers need the redis session store, which connects on first use only.
+    return {
+        **os.environ,
+        "LAISON_URL": "http://127.0.0.1:9/api",
+        "CONNECTION": "keep-alive",
+        "HUBTEL_FULFILLMENT": "http://127.0.0.1:9/fulfillment",
+        "HUBTEL_SMS": "http://127.0.0.1:9/sms",
+        "CLIENT_ID": "bench",
+        "CLIENT_SECRET": "bench-secret",
+        "HUBTEL_API_KEY": "bench-key",
+        "ROOT_KEY": "DCC78B3DAC5CA7409A01F45D81106753",
+        "CUSTOMER_CARE": "0200000000",
+        "LOG_LEVEL": "WARNING",
+        "SESSION_BACKEND": "redis",
+    }
+
+
+def commands(port: int, workers: int) -> dict[str, list[str]]:
+    uvicorn = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--app-dir", str(APP),
+        "--host", "127.0.0.1",
+        "--port", str(port),
+        "--log-level", "warning",
+        "--no-access-log",
+    ]
+    return {
+        "uvicorn": uvicorn,
+        f"uvicorn --workers {workers}": [*uvicorn, "--workers", str(workers)],
+        f"serve.py --workers {workers}": [
+            sys.executable, str(APP / "serve.py"),
+            "--host", "127.0.0.1",
+            "--port", str(port),
+            "--workers", str(workers),
+        ],
+    }
+
+
+def process_tree(pid: int) -> list[int]:
+    pids = [pid]
+    for parent in pids:
+        try:
+            children = Path(f"/proc/{parent}/task/{parent}/children").read_text().split()
+        except OSError:
+            continue
+        pids.extend(int(child) for child in children)
+    return pids
+
+
+def pss_mb(pids: list[int]) -> float:
+    total = 0
+    for pid in pids:
+        try:
+            for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+                if line.startswith("Pss:"):
+                    total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+def cpu_seconds(pids: list[int]) -> float:
+    ticks = 0
+    for pid in pids:
+        try:
+            fields = Path(f"/proc/{pid}/stat").read_text().rpartition(")")[2].split()
+        except OSError:
+            continue
+        # utime and stime, then the waited-for children's
+        ticks += sum(int(value) for value in fields[11:15])
+    return ticks / os.sysconf("SC_CLK_TCK")
+
+
+def wait_ready(port: int, workers: int, timeout: float = 60.0):
+    """Poll /ready until it succeeds ``workers`` times on fresh connections.
+
+    Each connection lands on whichever worker accepts it, so several
+    successes in a row are needed before all of them can be assumed warm.
+    """
+    deadline = time.monotonic() + timeout
+    streak = 0
+    # No keep-alive, so that each request is accepted afresh
+    client = httpx.Client(limits=httpx.Limits(max_keepalive_connections=0), timeout=1.0)
+    while streak < workers:
+        try:
+            response = client.get(f"http://127.0.0.1:{port}/ready")
+            streak = streak + 1 if response.status_code == 200 else 0
+        except httpx.TransportError:
+            streak = 0
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"/ready did not succeed within {timeout:.0f}s")
+        if streak == 0:
+            time.sleep(0.005)
+    client.close()
+
+
+def measure(command: list[str], port: int, workers: int, workdir: str) -> dict:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=workdir, env=app_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(port, workers)
+        ready = time.perf_counter() - started
+        # Let the remaining workers finish their lifespan before sampling
+        time.sleep(1.0)
+        pids = process_tree(process.pid)
+        return {
+            "ready": ready,
+            "cpu": cpu_seconds(pids),
+            "pss": pss_mb(pids),
+            "processes": len(pids),
+        }
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def import_time() -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    with tempfile.TemporaryDirectory(prefix="numa-startup-") as workdir:
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=workdir,
+            env={**app_env(), "PYTHONPATH": str(APP)},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    imports = [import_time() for _ in range(args.runs)]
+    print(f"import main: {statistics.median(imports) * 1000:.0f} ms (median of {args.runs})")
+
+    for name in commands(0, args.workers):
+        results = []
+        for _ in range(args.runs):
+            port = free_port()
+            workers = 1 if name == "uvicorn" else args.workers
+            with tempfile.TemporaryDirectory(prefix="numa-startup-") as workdir:
+                command = commands(port, args.workers)[name]
+                results.append(measure(command, port, workers, workdir))
+        print(
+            f"{name:24} ready {statistics.median(r['ready'] for r in results) * 1000:6.0f} ms  "
+            f"cpu {statistics.median(r['cpu'] for r in results):5.2f} s  "
+            f"pss {statistics.median(r['pss'] for r in results):6.1f} MB  "
+            f"({results[0]['processes']} processes)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Local stand-ins for LAPIS and Hubtel used by the load test.
+
+    python benchmarks/fakes.py lapis --port 9101 --latency 0.05 --errorcode-rate 0.02
+    python benchmarks/fakes.py hubtel --port 9102 --latency 0.08
+
+LAPIS answers in the ``key=value&...`` format services/lapis.py decodes.
+Every response waits ``latency`` seconds, +/- ``jitter`` of it. A share of
+requests fails with HTTP 500 (``--error-rate``), and a share of LAPIS answers
+carries a non-zero errorcode (``--errorcode-rate``/``--errorcode``).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import parse_qs
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+
+class Behaviour:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.5,
+        error_rate: float = 0.0,
+        errorcode_rate: float = 0.0,
+        errorcode: str = "10",
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.errorcode_rate = errorcode_rate
+        self.errorcode = errorcode
+        self.requests = 0
+
+    async def delay(self):
+        self.requests += 1
+        if self.latency > 0:
+            spread = self.latency * self.jitter
+            await asyncio.sleep(max(0.0, random.uniform(self.latency - spread, self.latency + spread)))
+
+    def fails(self) -> bool:
+        return random.random() < self.error_rate
+
+    def errors(self) -> bool:
+        return random.random() < self.errorcode_rate
+
+
+def create_lapis(behaviour: Behaviour) -> Starlette:
+    async def api(request: Request):
+        await behaviour.delay()
+        if behaviour.fails():
+            return PlainTextResponse("upstream error", status_code=500)
+
+        if request.method == "GET":
+            if request.query_params.get("function") != "querycustomerbymeternumber":
+                # Health checks and anything else LAPIS does not know about
+                return PlainTextResponse("errorcode=1&")
+            if behaviour.errors():
+                return PlainTextResponse(f"errorcode={behaviour.errorcode}&")
+            meter = request.query_params.get("meternumber", "")
+            return PlainTextResponse(f"errorcode=0&customername=customer {meter[-4:]}&")
+
+        form = await request.form()
+        if behaviour.errors():
+            return PlainTextResponse(f"errorcode={behaviour.errorcode}&")
+        token = f"{random.randrange(10**20):020d}"
+        return PlainTextResponse(
+            f"errorcode=0&transid={form.get('transid')}&tokenlist={token}"
+            "&rechargeamount=10.00&rechargevolume=5.2&"
+        )
+
+    async def stats(request: Request):
+        return JSONResponse({"requests": behaviour.requests})
+
+    return Starlette(
+        routes=[
+            Route("/api", api, methods=["GET", "POST"]),
+            Route("/stats", stats),
+        ]
+    )
+
+
+def create_hubtel(behaviour: Behaviour) -> Starlette:
+    # OrderId -> wall-clock time the confirmation arrived
+    confirmed: dict[str, float] = {}
+
+    async def sms(request: Request):
+        await behaviour.delay()
+        if behaviour.fails():
+            return JSONResponse({"message": "error"}, status_code=500)
+        return JSONResponse({"status": 0, "messageId": str(random.randrange(10**9))})
+
+    async def fulfillment(request: Request):
+        # The app sends a form body under a JSON content type; accept either
+        raw = (await request.body()).decode()
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            body = {key: values[0] for key, values in parse_qs(raw).items()}
+        await behaviour.delay()
+        if behaviour.fails():
+            return JSONResponse({"message": "error"}, status_code=500)
+        confirmed.setdefault(body.get("OrderId"), time.time())
+        return JSONResponse({"ResponseCode": "0000"})
+
+    async def stats(request: Request):
+        return JSONResponse({"requests": behaviour.requests, "confirmed": confirmed})
+
+    return Starlette(
+        routes=[
+            Route("/sms", sms, methods=["GET"]),
+            Route("/sms/batch", sms, methods=["POST"]),
+            Route("/fulfillment", fulfillment, methods=["POST"]),
+            Route("/stats", stats),
+        ]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("service", choices=["lapis", "hubtel"])
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--errorcode-rate", type=float, default=0.0)
+    parser.add_argument("--errorcode", default="10")
+    args = parser.parse_args()
+
+    behaviour = Behaviour(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        errorcode_rate=args.errorcode_rate,
+        errorcode=args.errorcode,
+    )
+    app = create_lapis(behaviour) if args.service == "lapis" else create_hubtel(behaviour)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
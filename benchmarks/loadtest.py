@@ -0,0 +1,462 @@
+"""End-to-end load test against local LAPIS and Hubtel stand-ins.
+
+Starts the fakes from benchmarks/fakes.py and the app under uvicorn, then
+drives full USSD sessions (Sequence 1 -> 2 -> 3, then the /payment webhook)
+at a fixed concurrency. Reports throughput and p50/p95/p99 per stage,
+including "fulfilment": the time from the payment webhook to the Hubtel
+confirmation arriving at the fake.
+
+    python benchmarks/loadtest.py --sessions 2000 --concurrency 50
+    python benchmarks/loadtest.py --record            # save as the baseline
+    python benchmarks/loadtest.py --env FAST_JSON=1   # compare a setting
+
+    # Session state carried in ClientState, which the driver echoes back
+    python benchmarks/loadtest.py --env STATELESS_SESSIONS=1 \
+        --env CLIENT_STATE_SECRET=load-test-secret
+
+    # Preforked workers behind fresh connections, as a load balancer spreads
+    # them; more than one worker needs a shared session store
+    python benchmarks/loadtest.py --workers 4 --fresh-connections \
+        --env SESSION_BACKEND=redis --env REDIS_URL=redis://127.0.0.1:6379/0
+
+The run exits non-zero when throughput drops or a stage's p95/p99 grows by
+more than --tolerance against the baseline, and refuses to run without one
+unless --record is given. Latencies depend on the machine, so the baseline
+is recorded on the one that runs the comparison rather than committed.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+STAGES = ("sequence_1", "sequence_2", "sequence_3", "payment", "fulfilment")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Stage:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors = 0
+
+    def summary(self) -> dict:
+        values = sorted(self.latencies)
+        return {
+            "count": len(values),
+            "errors": self.errors,
+            "p50": percentile(values, 0.50) * 1000,
+            "p95": percentile(values, 0.95) * 1000,
+            "p99": percentile(values, 0.99) * 1000,
+        }
+
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.TemporaryDirectory(prefix="numa-loadtest-")
+        self.processes: list[subprocess.Popen] = []
+        self.lapis_port = free_port()
+        self.hubtel_port = free_port()
+        self.app_port = free_port()
+
+    def spawn(self, command: list[str], env: dict | None = None):
+        self.processes.append(
+            subprocess.Popen(command, cwd=self.workdir.name, env=env or os.environ.copy())
+        )
+
+    def app_env(self) -> dict:
+        hubtel = f"http://127.0.0.1:{self.hubtel_port}"
+        env = {
+            **os.environ,
+            "LAISON_URL": f"http://127.0.0.1:{self.lapis_port}/api",
+            "CONNECTION": "keep-alive",
+            "HUBTEL_FULFILLMENT": f"{hubtel}/fulfillment",
+            "HUBTEL_SMS": f"{hubtel}/sms",
+            "CLIENT_ID": "loadtest",
+            "CLIENT_SECRET": "loadtest-secret",
+            "HUBTEL_API_KEY": "loadtest-key",
+            "ROOT_KEY": "DCC78B3DAC5CA7409A01F45D81106753",
+            "CUSTOMER_CARE": "0200000000",
+            "LOG_LEVEL": "WARNING",
+        }
+        for pair in self.args.env:
+            key, _, value = pair.partition("=")
+            env[key] = value
+        return env
+
+    def start(self):
+        args = self.args
+        fakes = str(ROOT / "benchmarks" / "fakes.py")
+        common = ["--jitter", str(args.jitter)]
+        self.spawn(
+            [
+                sys.executable, fakes, "lapis",
+                "--port", str(self.lapis_port),
+                "--latency", str(args.lapis_latency),
+                "--error-rate", str(args.lapis_error_rate),
+                "--errorcode-rate", str(args.lapis_errorcode_rate),
+                "--errorcode", args.lapis_errorcode,
+                *common,
+            ]
+        )
+        self.spawn(
+            [
+                sys.executable, fakes, "hubtel",
+                "--port", str(self.hubtel_port),
+                "--latency", str(args.hubtel_latency),
+                "--error-rate", str(args.hubtel_error_rate),
+                *common,
+            ]
+        )
+        if args.workers:
+            app = [
+                sys.executable, str(ROOT / "app" / "serve.py"),
+                "--host", "127.0.0.1",
+                "--port", str(self.app_port),
+                "--workers", str(args.workers),
+            ]
+        else:
+            app = [
+                sys.executable, "-m", "uvicorn", "main:app",
+                "--app-dir", str(ROOT / "app"),
+                "--host", "127.0.0.1",
+                "--port", str(self.app_port),
+                "--log-level", "warning",
+                "--no-access-log",
+            ]
+        self.spawn(app, env=self.app_env())
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.workdir.cleanup()
+
+    @property
+    def app_url(self) -> str:
+        return f"http://127.0.0.1:{self.app_port}"
+
+    @property
+    def hubtel_url(self) -> str:
+        return f"http://127.0.0.1:{self.hubtel_port}"
+
+    async def wait_ready(self, client: httpx.AsyncClient, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        for url in (
+            f"http://127.0.0.1:{self.lapis_port}/stats",
+            f"{self.hubtel_url}/stats",
+            f"{self.app_url}/ready",
+        ):
+            while True:
+                try:
+                    if (await client.get(url)).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                for process in self.processes:
+                    if process.poll() is not None:
+                        raise RuntimeError(f"{' '.join(process.args[1:3])} exited during startup")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+                await asyncio.sleep(0.1)
+
+
+def callback(
+    session_id: str, sequence: int, message: str, mobile: str, client_state: str | None = None
+) -> dict:
+    return {
+        "Type": "Initiation" if sequence == 1 else "Response",
+        "Message": message,
+        "ServiceCode": "713",
+        "Operator": "mtn",
+        "ClientState": client_state,
+        "Mobile": mobile,
+        "SessionId": session_id,
+        "Sequence": sequence,
+        "Platform": "USSD",
+    }
+
+
+def payment(session_id: str, order_id: str, amount: float, mobile: str) -> dict:
+    return {
+        "SessionId": session_id,
+        "OrderId": order_id,
+        "ExtraData": {},
+        "OrderInfo": {
+            "CustomerMobileNumber": mobile,
+            "CustomerEmail": None,
+            "CustomerName": "Load Test",
+            "Status": "Paid",
+            "OrderDate": "2024-10-01T10:00:00.000Z",
+            "Currency": "GHS",
+            "BranchName": "Load Test",
+            "IsRecurring": False,
+            "RecurringInvoiceId": None,
+            "Subtotal": amount,
+            "Items": [{"ItemId": "1", "Name": "Send Money", "Quantity": 1, "UnitPrice": amount}],
+            "Payment": {
+                "PaymentType": "mobilemoney",
+                "AmountPaid": amount,
+                "AmountAfterCharges": amount,
+                "PaymentDate": "2024-10-01T10:00:00.000Z",
+                "PaymentDescription": "Load test",
+                "IsSuccessful": True,
+            },
+        },
+    }
+
+
+class Driver:
+    def __init__(self, client: httpx.AsyncClient, base_url: str, meters: int):
+        self.client = client
+        self.base_url = base_url
+        self.meters = meters
+        self.stages = {stage: Stage() for stage in STAGES}
+        self.released = 0
+        self.completed = 0
+        # OrderId -> wall-clock time the payment webhook was acknowledged
+        self.paid_at: dict[str, float] = {}
+        self.record = True
+        # Runs on across the warm-up and the measured run
+        self.subscribers = itertools.count()
+
+    async def hop(self, stage: str, path: str, body: dict) -> dict | None:
+        start = time.perf_counter()
+        try:
+            res = await self.client.post(f"{self.base_url}{path}", json=body)
+        except httpx.HTTPError:
+            if self.record:
+                self.stages[stage].errors += 1
+            return None
+        if self.record:
+            self.stages[stage].latencies.append(time.perf_counter() - start)
+            if res.status_code != 200:
+                self.stages[stage].errors += 1
+        return res.json() if res.status_code == 200 else None
+
+    async def session(self, index: int):
+        session_id = uuid.uuid4().hex
+        meter = f"{index % self.meters:013d}"
+        # A Mobile no earlier session has used, warm-up included: its three
+        # callbacks stay within the per-MSISDN admission burst
+        mobile = f"233{next(self.subscribers):09d}"
+        # Echoed back as the gateway does, for STATELESS_SESSIONS=1
+        client_state = None
+        for sequence, message in ((1, "*713#"), (2, meter), (3, "20")):
+            reply = await self.hop(
+                f"sequence_{sequence}",
+                "/api/v1/callback",
+                callback(session_id, sequence, message, mobile, client_state),
+            )
+            if reply is None:
+                return
+            client_state = reply.get("ClientState")
+            if reply.get("Type", "").lower() == "release":
+                # An injected LAPIS errorcode ends the session early
+                self.released += self.record
+                return
+
+        order_id = uuid.uuid4().hex
+        reply = await self.hop(
+            "payment", "/api/v1/payment", payment(session_id, order_id, 20.0, mobile)
+        )
+        if reply is None:
+            return
+        if self.record:
+            self.paid_at[order_id] = time.time()
+            self.completed += 1
+
+    async def run(self, sessions: int, concurrency: int) -> float:
+        counter = iter(range(sessions))
+
+        async def worker():
+            for index in counter:
+                await self.session(index)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+
+async def drain(client: httpx.AsyncClient, harness: Harness, timeout: float):
+    """Wait until the fulfilment queue has nothing pending or running."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        counts = (await client.get(f"{harness.app_url}/fulfilment-stats")).json()
+        if not counts.get("pending") and not counts.get("running"):
+            return
+        await asyncio.sleep(0.2)
+    print(f"warning: fulfilment queue not drained after {timeout:.0f}s", file=sys.stderr)
+
+
+async def measure(args, harness: Harness) -> dict:
+    limits = httpx.Limits(
+        max_connections=args.concurrency + 10,
+        max_keepalive_connections=0 if args.fresh_connections else None,
+    )
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+        await harness.wait_ready(client)
+
+        driver = Driver(client, harness.app_url, args.meters)
+        driver.record = False
+        await driver.run(args.warmup, min(args.concurrency, max(1, args.warmup)))
+        driver.record = True
+
+        elapsed = await driver.run(args.sessions, args.concurrency)
+        await drain(client, harness, args.drain_timeout)
+
+        confirmed = (await client.get(f"{harness.hubtel_url}/stats")).json()["confirmed"]
+        fulfilment = driver.stages["fulfilment"]
+        for order_id, paid_at in driver.paid_at.items():
+            if order_id in confirmed:
+                # The webhook can be acknowledged after inline fulfilment finished
+                fulfilment.latencies.append(max(0.0, confirmed[order_id] - paid_at))
+            else:
+                fulfilment.errors += 1
+
+    return {
+        "config": {
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "meters": args.meters,
+            "lapis_latency": args.lapis_latency,
+            "hubtel_latency": args.hubtel_latency,
+            "lapis_error_rate": args.lapis_error_rate,
+            "lapis_errorcode_rate": args.lapis_errorcode_rate,
+            "hubtel_error_rate": args.hubtel_error_rate,
+            "workers": args.workers,
+            "fresh_connections": args.fresh_connections,
+            "env": sorted(args.env),
+        },
+        "elapsed": elapsed,
+        "throughput": driver.completed / elapsed if elapsed else 0.0,
+        "released": driver.released,
+        "stages": {stage: driver.stages[stage].summary() for stage in STAGES},
+    }
+
+
+def report(result: dict):
+    print(
+        f"\n{result['config']['sessions']} sessions at concurrency "
+        f"{result['config']['concurrency']} in {result['elapsed']:.2f}s: "
+        f"{result['throughput']:.1f} paid sessions/s, {result['released']} released early"
+    )
+    print(f"{'stage':12} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, summary in result["stages"].items():
+        print(
+            f"{stage:12} {summary['count']:7d} {summary['errors']:7d} "
+            f"{summary['p50']:9.2f} {summary['p95']:9.2f} {summary['p99']:9.2f}"
+        )
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    if baseline["config"] != result["config"]:
+        print("warning: baseline was recorded with a different configuration", file=sys.stderr)
+
+    if result["throughput"] < baseline["throughput"] * (1 - tolerance):
+        regressions.append(
+            f"throughput {result['throughput']:.1f}/s < baseline {baseline['throughput']:.1f}/s"
+        )
+    for stage, summary in result["stages"].items():
+        previous = baseline["stages"].get(stage)
+        if previous is None:
+            continue
+        for key in ("p95", "p99"):
+            if summary[key] > previous[key] * (1 + tolerance):
+                regressions.append(
+                    f"{stage} {key} {summary[key]:.2f}ms > baseline {previous[key]:.2f}ms"
+                )
+        if summary["errors"] > previous["errors"]:
+            regressions.append(
+                f"{stage} errors {summary['errors']} > baseline {previous['errors']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--meters", type=int, default=500, help="distinct meter numbers")
+    parser.add_argument("--lapis-latency", type=float, default=0.05)
+    parser.add_argument("--hubtel-latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--lapis-error-rate", type=float, default=0.0)
+    parser.add_argument("--lapis-errorcode-rate", type=float, default=0.0)
+    parser.add_argument("--lapis-errorcode", default="10")
+    parser.add_argument("--hubtel-error-rate", type=float, default=0.0)
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--workers", type=int, default=0,
+        help="serve through app/serve.py with this many workers; 0 runs plain uvicorn",
+    )
+    parser.add_argument(
+        "--fresh-connections", action="store_true",
+        help="open a new connection for every request, so hops land on any worker",
+    )
+    parser.add_argument(
+        "--env", action="append", default=[], metavar="KEY=VALUE",
+        help="extra setting for the app under test",
+    )
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--record", action="store_true", help="save this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    if not args.record and not args.baseline.exists():
+        parser.error(f"no baseline at {args.baseline}; run with --record to create one")
+
+    harness = Harness(args)
+    harness.start()
+    try:
+        result = asyncio.run(measure(args, harness))
+    finally:
+        harness.stop()
+
+    report(result)
+
+    if args.record:
+        args.baseline.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"\nBaseline recorded to {args.baseline}")
+        return
+
+    regressions = compare(result, json.loads(args.baseline.read_text()), args.tolerance)
+    if regressions:
+        print("\nREGRESSION against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nWithin {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+
+# Settings are read when app modules are imported; none of these is contacted
+for name in (
+    "LAISON_URL",
+    "CONNECTION",
+    "HUBTEL_FULFILLMENT",
+    "HUBTEL_SMS",
+    "CLIENT_ID",
+    "CLIENT_SECRET",
+    "HUBTEL_API_KEY",
+    "CUSTOMER_CARE",
+):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("ROOT_KEY", "DCC78B3DAC5CA7409A01F45D81106753")
+os.environ.setdefault("SUPPORT_API_KEY", "test-support-key")
+os.environ.setdefault("CLIENT_STATE_SECRET", "test-client-state-secret")
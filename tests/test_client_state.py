@@ -0,0 +1,54 @@
+import pytest
+
+import services.client_state as client_state
+from services.client_state import _b64decode, _b64encode, decode_client_state, encode_client_state
+
+STATE = {"meter_number": "1234567890123", "customer_name": "JOHN DOE", "step": "amount"}
+
+
+def test_round_trip_keeps_only_known_fields():
+    token = encode_client_state("s1", {**STATE, "unknown": "dropped"})
+    assert decode_client_state("s1", token) == STATE
+
+
+def test_tampered_payload_is_rejected():
+    payload, signature = encode_client_state("s1", STATE).split(".")
+    forged = _b64decode(payload).replace(b"1234567890123", b"9999999999999")
+    assert decode_client_state("s1", f"{_b64encode(forged)}.{signature}") is None
+
+
+def test_tampered_signature_is_rejected():
+    payload, signature = encode_client_state("s1", STATE).split(".")
+    flipped = bytes([_b64decode(signature)[0] ^ 1]) + _b64decode(signature)[1:]
+    assert decode_client_state("s1", f"{payload}.{_b64encode(flipped)}") is None
+
+
+def test_token_is_bound_to_its_session():
+    assert decode_client_state("s2", encode_client_state("s1", STATE)) is None
+
+
+@pytest.mark.parametrize("token", [None, "", "no-dot", "!!.!!", "e30.AAAA"])
+def test_malformed_tokens_are_rejected(token):
+    assert decode_client_state("s1", token) is None
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    token = encode_client_state("s1", STATE)
+    now = client_state.time.time()
+    monkeypatch.setattr(
+        client_state.time, "time", lambda: now + client_state.settings.session_ttl + 1
+    )
+    assert decode_client_state("s1", token) is None
+
+
+def test_unset_secret_raises(monkeypatch):
+    token = encode_client_state("s1", STATE)
+    monkeypatch.setattr(
+        client_state,
+        "settings",
+        client_state.settings.model_copy(update={"client_state_secret": ""}),
+    )
+    with pytest.raises(RuntimeError):
+        encode_client_state("s1", STATE)
+    with pytest.raises(RuntimeError):
+        decode_client_state("s1", token)
@@ -0,0 +1,23 @@
+import pytest
+
+from core.flow import InvalidInput, parse_meter_number
+
+
+def test_parse_meter_number_strips_spaces():
+    assert parse_meter_number(" 1234 5678 90123 ", min_length=13) == "1234567890123"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "123456789012",  # too short
+        "12345678901ab",
+        # Unicode digits pass str.isdigit() but are not a meter number
+        "١٢٣٤٥٦٧٨٩٠١٢٣",
+        "１２３４５６７８９０１２３",
+        "¹²³⁴⁵⁶⁷⁸⁹⁰¹²³",
+    ],
+)
+def test_parse_meter_number_rejects(text):
+    with pytest.raises(InvalidInput):
+        parse_meter_number(text, min_length=13)
@@ -0,0 +1,66 @@
+import asyncio
+
+import services.fulfilment as fulfilment
+from services.fulfilment import FulfilmentWorker
+from services.queue import JobQueue
+
+
+def test_worker_runs_jobs_concurrently(tmp_path, monkeypatch):
+    running = 0
+    peak = 0
+
+    async def fulfil_order(order, on_progress):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+
+    monkeypatch.setattr(fulfilment, "fulfil_order", fulfil_order)
+    worker = FulfilmentWorker(JobQueue(str(tmp_path / "queue.db")))
+
+    async def run():
+        worker.start(3)
+        for index in range(6):
+            await worker.submit({"order_id": f"order-{index}"})
+        for _ in range(100):
+            if (await worker.queue.counts()).get("done") == 6:
+                break
+            await asyncio.sleep(0.02)
+        await worker.stop()
+        return await worker.queue.counts()
+
+    assert asyncio.run(run()) == {"done": 6}
+    assert peak == 3
+
+
+def test_submit_during_idle_claim_is_not_missed(tmp_path, monkeypatch):
+    async def fulfil_order(order, on_progress):
+        pass
+
+    monkeypatch.setattr(fulfilment, "fulfil_order", fulfil_order)
+    # Polling alone would take far longer than the test waits
+    monkeypatch.setattr(
+        fulfilment, "settings", fulfilment.settings.model_copy(update={"fulfilment_poll_interval": 60})
+    )
+    worker = FulfilmentWorker(JobQueue(str(tmp_path / "queue.db")))
+    claim = worker.queue.claim
+
+    async def slow_claim():
+        job = await claim()
+        await asyncio.sleep(0.05)
+        return job
+
+    worker.queue.claim = slow_claim
+
+    async def run():
+        worker.start(1)
+        # Lands while the first, empty claim is still running
+        await asyncio.sleep(0.01)
+        await worker.submit({"order_id": "order-1"})
+        await asyncio.sleep(0.3)
+        status = await worker.queue.status("order-1")
+        await worker.stop()
+        return status
+
+    assert asyncio.run(run()) == "done"
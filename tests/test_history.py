@@ -0,0 +1,23 @@
+import asyncio
+
+from services.client_state import decode_client_state, encode_client_state
+from services.history import LastPurchase, PurchaseHistory
+
+
+def test_history_finds_purchase_whatever_the_mobile_format(tmp_path):
+    history = PurchaseHistory(str(tmp_path / "history.db"), maxsize=10)
+    purchase = LastPurchase("1234567890123", "JOHN DOE", 20.0)
+
+    async def run():
+        await history.record("0241234567", purchase)
+        cached = await history.get("+233241234567")
+        # A fresh process only has SQLite to go on
+        reopened = PurchaseHistory(str(tmp_path / "history.db"), maxsize=10)
+        return cached, await reopened.get("233241234567")
+
+    assert asyncio.run(run()) == (purchase, purchase)
+
+
+def test_client_state_carries_the_dialling_mobile():
+    token = encode_client_state("s1", {"meter_number": "1", "mobile": "0241234567"})
+    assert decode_client_state("s1", token)["mobile"] == "0241234567"
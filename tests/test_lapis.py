@@ -0,0 +1,39 @@
+from services.lapis import decode_response, format_tokens, parse_tokens
+
+TOKEN = "12345678901234567890"
+OTHER = "09876543210987654321"
+
+
+def test_decode_response_url_decodes_only_encoded_values():
+    fields = decode_response("errorcode=0&customername=JOHN+DOE&note=a=b&")
+    assert fields == {"errorcode": "0", "customername": "JOHN DOE", "note": "a=b"}
+
+
+def test_parse_tokens_single():
+    assert parse_tokens(TOKEN) == [TOKEN]
+
+
+def test_parse_tokens_separated_and_back_to_back():
+    assert parse_tokens(f"{TOKEN},{OTHER}") == [TOKEN, OTHER]
+    assert parse_tokens(f"{TOKEN}; {OTHER}|") == [TOKEN, OTHER]
+    assert parse_tokens(TOKEN + OTHER) == [TOKEN, OTHER]
+
+
+def test_parse_tokens_keeps_grouped_token_whole():
+    assert parse_tokens("1234-5678-9012-3456-7890") == [TOKEN]
+    assert parse_tokens("1234 5678 9012 3456 7890,0987 6543 2109 8765 4321") == [TOKEN, OTHER]
+
+
+def test_parse_tokens_drops_fragments():
+    assert parse_tokens(f"{TOKEN},12345") == [TOKEN]
+    assert parse_tokens(TOKEN + "123") == []
+    assert parse_tokens(f"{TOKEN},12ab") == [TOKEN]
+    assert parse_tokens("") == []
+    assert parse_tokens(None) == []
+
+
+def test_format_tokens():
+    assert format_tokens([TOKEN]) == "Token: 1234 5678 9012 3456 7890"
+    assert format_tokens([TOKEN, OTHER]) == (
+        "Tokens:\n1. 1234 5678 9012 3456 7890\n2. 0987 6543 2109 8765 4321"
+    )
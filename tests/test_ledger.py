@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+import services.payments as payments
+from services.fulfilment import FulfilmentWorker
+from services.ledger import RECEIVED, SMS_SENT, OrderLedger
+from services.queue import JobQueue
+from services.session import MemorySessionStore
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    ledger = OrderLedger(str(tmp_path / "ledger.db"), cache_size=100)
+    worker = FulfilmentWorker(JobQueue(str(tmp_path / "queue.db")))
+    sessions = MemorySessionStore(maxsize=100, ttl=60, shards=1)
+    asyncio.run(sessions.set("session-1", {"meter_number": "1234567890123"}))
+    monkeypatch.setattr(payments, "ledger", ledger)
+    monkeypatch.setattr(payments, "fulfilment_worker", worker)
+    monkeypatch.setattr(payments, "sessions", sessions)
+    return ledger
+
+
+def pay():
+    return payments.handle_payment(
+        session_id="session-1",
+        order_id="order-1",
+        is_successful=True,
+        amount=20.0,
+        customer_number="233241234567",
+    )
+
+
+def test_record_survives_a_restart(tmp_path):
+    path = str(tmp_path / "ledger.db")
+
+    async def run():
+        await OrderLedger(path, cache_size=100).record({"order_id": "order-1", "sms_sent": True})
+        return await OrderLedger(path, cache_size=100).get("order-1")
+
+    order = asyncio.run(run())
+    assert order["state"] == SMS_SENT
+
+
+def test_duplicate_delivery_returns_stored_outcome(ledger):
+    async def run():
+        return await pay(), await pay(), await payments.fulfilment_worker.queue.counts()
+
+    first, second, counts = asyncio.run(run())
+    assert first == {"messages": "Payment received"}
+    assert second == {"messages": "Payment received", "state": RECEIVED}
+    assert counts == {"pending": 1}
+
+
+def test_concurrent_duplicates_are_serialised(ledger, monkeypatch):
+    submitted = []
+    submit = payments.fulfilment_worker.submit
+
+    async def counting_submit(order):
+        submitted.append(order["order_id"])
+        # Gives the other deliveries a chance to run while this one waits
+        await asyncio.sleep(0.01)
+        return await submit(order)
+
+    monkeypatch.setattr(payments.fulfilment_worker, "submit", counting_submit)
+
+    async def run():
+        return await asyncio.gather(*(pay() for _ in range(5)))
+
+    replies = asyncio.run(run())
+    assert submitted == ["order-1"]
+    assert sum("state" not in reply for reply in replies) == 1
+
+
+def test_order_is_recorded_before_it_is_queued(ledger, monkeypatch):
+    recorded = []
+
+    async def submit(order):
+        recorded.append(await ledger.get(order["order_id"]))
+
+    monkeypatch.setattr(payments.fulfilment_worker, "submit", submit)
+    asyncio.run(pay())
+    assert recorded[0] is not None
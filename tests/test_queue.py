@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from services.queue import JobQueue
+
+
+def test_enqueue_ignores_a_second_job_for_the_order(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+
+    async def run():
+        first = await queue.enqueue("order-1", {"order_id": "order-1"})
+        second = await queue.enqueue("order-1", {"order_id": "order-1", "changed": True})
+        return first, second, await queue.claim(), await queue.counts()
+
+    first, second, job, counts = asyncio.run(run())
+    assert (first, second) == (True, False)
+    assert job == ("order-1", {"order_id": "order-1"}, 1)
+    assert counts == {"running": 1}
+
+
+def test_claimed_job_is_leased(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+
+    async def run():
+        await queue.enqueue("order-1", {})
+        return await queue.claim(), await queue.claim()
+
+    job, again = asyncio.run(run())
+    assert job is not None
+    assert again is None
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"), lease=0.01)
+
+    async def run():
+        await queue.enqueue("order-1", {})
+        first = await queue.claim()
+        time.sleep(0.02)
+        return first, await queue.claim()
+
+    first, second = asyncio.run(run())
+    assert first[2] == 1
+    assert second == ("order-1", {}, 2)
+
+
+def test_retry_waits_for_its_delay(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+
+    async def run():
+        await queue.enqueue("order-1", {})
+        await queue.claim()
+        await queue.retry("order-1", "upstream down", delay=60)
+        waiting = await queue.claim()
+        status = await queue.status("order-1")
+        await queue.retry("order-1", "upstream down", delay=0)
+        return waiting, status, await queue.claim()
+
+    waiting, status, job = asyncio.run(run())
+    assert waiting is None
+    assert status == "pending"
+    assert job == ("order-1", {}, 2)
+
+
+def test_complete_and_fail_are_final(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+
+    async def run():
+        await queue.enqueue("order-1", {})
+        await queue.enqueue("order-2", {})
+        await queue.claim()
+        await queue.claim()
+        await queue.complete("order-1")
+        await queue.fail("order-2", "gave up")
+        return await queue.claim(), await queue.counts()
+
+    job, counts = asyncio.run(run())
+    assert job is None
+    assert counts == {"done": 1, "failed": 1}
@@ -0,0 +1,97 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    ServiceBusy,
+    Upstream,
+)
+
+
+def open_breaker(reset_timeout: float = 60.0) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = open_breaker(reset_timeout=0.0)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes():
+    breaker = open_breaker(reset_timeout=0.0)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = open_breaker(reset_timeout=0.0)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_abandoned_probe_frees_the_slot():
+    breaker = open_breaker(reset_timeout=0.0)
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_limiter_refusal_does_not_wedge_half_open_breaker():
+    upstream = Upstream("test")
+    upstream.breaker = open_breaker(reset_timeout=0.0)
+    upstream.limiter.inflight = int(upstream.limiter.limit)
+
+    async def send():
+        return httpx.Response(200)
+
+    with pytest.raises(ServiceBusy):
+        asyncio.run(upstream.call(send, deadline=1.0))
+    assert not upstream.breaker._probing
+
+    upstream.limiter.inflight = 0
+    assert asyncio.run(upstream.call(send, deadline=1.0)).status_code == 200
+    assert upstream.breaker.state == CLOSED
+
+
+def test_background_calls_cannot_take_the_lookup_slots():
+    upstream = Upstream("test")
+    upstream.background_limiter.inflight = int(upstream.background_limiter.limit)
+
+    async def send():
+        return httpx.Response(200)
+
+    with pytest.raises(ServiceBusy):
+        asyncio.run(upstream.call(send, deadline=1.0, background=True))
+    assert asyncio.run(upstream.call(send, deadline=1.0)).status_code == 200
@@ -0,0 +1,45 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.v1.routers import tokens
+from services.sms import RateLimiter
+from services.vault import NOT_FOUND, SENT
+
+KEY = {"X-Support-Key": "test-support-key"}
+
+
+def client(monkeypatch, outcome=SENT, per_minute=30) -> TestClient:
+    async def resend_token(**kwargs):
+        return outcome
+
+    monkeypatch.setattr(tokens, "resend_token", resend_token)
+    monkeypatch.setattr(tokens, "_resends", RateLimiter(per_minute / 60, per_minute))
+    app = FastAPI()
+    app.include_router(tokens.router)
+    return TestClient(app)
+
+
+def test_requires_support_key(monkeypatch):
+    c = client(monkeypatch)
+    assert c.post("/api/v1/tokens/resend", json={"mobile": "233241234567"}).status_code == 401
+    response = c.post(
+        "/api/v1/tokens/resend", json={"mobile": "233241234567"}, headers={"X-Support-Key": "x"}
+    )
+    assert response.status_code == 401
+    response = c.post("/api/v1/tokens/resend", json={"mobile": "233241234567"}, headers=KEY)
+    assert response.status_code == 200
+
+
+def test_not_found(monkeypatch):
+    c = client(monkeypatch, outcome=NOT_FOUND)
+    response = c.post("/api/v1/tokens/resend", json={"meter_number": "1"}, headers=KEY)
+    assert response.status_code == 404
+
+
+def test_caps_resends_across_meters(monkeypatch):
+    c = client(monkeypatch, per_minute=2)
+    codes = [
+        c.post("/api/v1/tokens/resend", json={"meter_number": str(n)}, headers=KEY).status_code
+        for n in range(3)
+    ]
+    assert codes == [200, 200, 429]
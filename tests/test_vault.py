@@ -0,0 +1,31 @@
+import asyncio
+
+from core.flow import normalise_msisdn
+from services.vault import TokenVault
+
+TOKEN = "12345678901234567890"
+
+
+def test_normalise_msisdn():
+    assert normalise_msisdn("0241234567", "233") == "233241234567"
+    assert normalise_msisdn("+233 24 123 4567", "233") == "233241234567"
+    assert normalise_msisdn("00233241234567", "233") == "233241234567"
+    assert normalise_msisdn("233241234567", "233") == "233241234567"
+
+
+def test_vault_finds_token_whatever_the_mobile_format(tmp_path):
+    vault = TokenVault(str(tmp_path / "vault.db"), b"k" * 32, retention_days=1)
+
+    async def run():
+        await vault.store("order-1", "1234567890123", "0241234567", [TOKEN], "20", "13.5")
+        return (
+            await vault.latest(mobile="+233241234567"),
+            await vault.latest(meter_number="1234567890123"),
+            await vault.latest(mobile="233200000000"),
+        )
+
+    by_mobile, by_meter, other = asyncio.run(run())
+    assert by_mobile["tokens"] == [TOKEN]
+    assert by_mobile["mobile"] == "233241234567"
+    assert by_meter["transaction_id"] == "order-1"
+    assert other is None